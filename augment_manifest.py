@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+from collections import Counter
+
+from augment_writer import INDEX_NAME
+
+MANIFEST_NAME = '.augment_manifest.json'
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Output key for an input: derived from its content, so output names stay the
+# same no matter how the input folder is listed or what the file is called
+def content_key(sha256):
+    return sha256[:16]
+
+
+# Short digest of the settings outputs are made with (output mode, format,
+# quality, tensor size, backend, seed, decode limits)
+def settings_digest(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+
+# Records, per input file name, the size/mtime and content hash it had when it
+# was augmented, the settings it was augmented with and the outputs that
+# produced. Lets rotate.py skip inputs that have not changed since the last
+# run; inputs augmented with other settings are done again. Lives in the
+# output folder.
+class AugmentManifest:
+    def __init__(self, output_folder, settings=None):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.settings = settings_digest(settings or {})
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        # How many inputs map to each content key, in all and with the current settings
+        self._keys = Counter(entry['key'] for entry in self.entries.values())
+        self._current = Counter(entry['key'] for entry in self.entries.values() if self._is_current(entry))
+        self._outputs = {}
+        for entry in sorted(self.entries.values(), key=self._is_current):
+            self._outputs[entry['key']] = entry['outputs']
+        # Shard members whose index.jsonl lines are dropped on save()
+        self._stale = set()
+        self._reindex = False
+
+    def _is_current(self, entry):
+        return entry.get('settings') == self.settings
+
+    # Same size and mtime as last time, and the same settings: trusted without re-hashing
+    def is_unchanged(self, name, stat):
+        entry = self.entries.get(name)
+        return (bool(entry) and self._is_current(entry)
+                and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns)
+
+    # Content already augmented with the current settings
+    def has_content(self, sha256):
+        return self._current[content_key(sha256)] > 0
+
+    def record(self, name, stat, sha256, outputs):
+        old = self.entries.get(name)
+        key = content_key(sha256)
+        if old:
+            self._keys[old['key']] -= 1
+            if self._is_current(old):
+                self._current[old['key']] -= 1
+        self._keys[key] += 1
+        self._current[key] += 1
+        self._outputs[key] = outputs
+        self._stale.difference_update(outputs)
+        self.entries[name] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'sha256': sha256,
+            'key': key,
+            'settings': self.settings,
+            'outputs': outputs,
+        }
+        # The file's content changed: drop outputs of the old content unless
+        # another input still has that content
+        if old and old['key'] != key and self._keys[old['key']] <= 0:
+            del self._outputs[old['key']]
+            self._drop_outputs(old['outputs'])
+        elif old and not self._is_current(old):
+            # Remade with other settings: drop what these settings no longer
+            # produce; shard members remade under the same name are reindexed
+            self._drop_outputs(set(old['outputs']) - set(outputs))
+            self._reindex = True
+
+    # Outputs are files in "files" mode and shard members otherwise; members
+    # cannot be cut out of a shard, so only their index.jsonl lines go
+    def _drop_outputs(self, outputs):
+        for output in outputs:
+            try:
+                os.remove(os.path.join(self.output_folder, output))
+            except FileNotFoundError:
+                self._stale.add(output)
+                self._reindex = True
+
+    # Rewrite index.jsonl without stale members, keeping only the latest line
+    # for members written again
+    def _rewrite_index(self):
+        index_path = os.path.join(self.output_folder, INDEX_NAME)
+        if not os.path.exists(index_path):
+            return
+        latest = {}
+        with open(index_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    latest.pop(record['name'], None)
+                    latest[record['name']] = line if line.endswith('\n') else line + '\n'
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(line for name, line in latest.items() if name not in self._stale)
+        os.replace(tmp_path, index_path)
+
+    def outputs_for(self, sha256):
+        return self._outputs.get(content_key(sha256), [])
+
+    # Write to a temp file and rename, so an interrupted run never leaves a
+    # broken manifest. Call after the run's shard writer is closed.
+    def save(self):
+        if self._reindex:
+            self._rewrite_index()
+            self._stale.clear()
+            self._reindex = False
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,162 @@
+import glob
+import io
+import json
+import os
+import tarfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Output modes: one file per sample, WebDataset-style tar shards, or shards of
+# fixed-size raw uint8 tensors that can be opened with np.memmap
+OUTPUT_MODES = ('files', 'tar', 'memmap')
+
+# Formats PIL encodes every sample with, and the extension used for each
+OUTPUT_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+INDEX_NAME = 'index.jsonl'
+TENSOR_INFO_NAME = 'tensors.json'
+
+
+# Encode an RGB uint8 array or PIL image with the given format/quality
+def encode_image(image, output_format='jpeg', quality=90):
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    image.save(buffer, output_format.upper(), quality=quality)
+    return buffer.getvalue()
+
+
+# Resize to a (width, height) tensor; always returns a new contiguous array,
+# so the caller may keep it after the source buffer is reused
+def to_tensor(image, tensor_size):
+    arr = np.asarray(image)
+    if (arr.shape[1], arr.shape[0]) == tuple(tensor_size):
+        return np.array(arr)
+    return cv2.resize(np.ascontiguousarray(arr), tuple(tensor_size), interpolation=cv2.INTER_AREA)
+
+
+# Number the next shard after those already in the folder, so a later
+# (e.g. incremental) run appends shards instead of overwriting them
+def _next_shard(output_folder, pattern):
+    return len(glob.glob(os.path.join(output_folder, pattern)))
+
+
+# Writes each sample as its own file in the output folder
+class FileWriter:
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+
+    def write(self, name, data):
+        with open(os.path.join(self.output_folder, name), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+# Packs encoded samples into tar shards of shard_size members. Member names
+# follow WebDataset's <key>.<ext> convention, and every member is listed in
+# index.jsonl with its shard and byte offset/size for random access.
+class TarShardWriter:
+    def __init__(self, output_folder, shard_size=1000):
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        self._shard_number = _next_shard(output_folder, 'shard-*.tar')
+        self._tar = None
+        self._shard_name = None
+        self._count = 0
+        self._index = open(os.path.join(output_folder, INDEX_NAME), 'a', encoding='utf-8')
+
+    def _open_shard(self):
+        self._shard_name = f'shard-{self._shard_number:05d}.tar'
+        self._shard_number += 1
+        self._tar = tarfile.open(os.path.join(self.output_folder, self._shard_name), 'w')
+        self._count = 0
+
+    def write(self, name, data):
+        if self._tar is None or self._count >= self.shard_size:
+            self._close_shard()
+            self._open_shard()
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        self._tar.addfile(info, io.BytesIO(data))
+        self._count += 1
+        # The member's data is the last block-padded run written so far
+        padded_size = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        self._index.write(json.dumps({
+            'name': name, 'shard': self._shard_name, 'offset': self._tar.offset - padded_size, 'size': info.size,
+        }) + '\n')
+
+    def _close_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+    def close(self):
+        self._close_shard()
+        self._index.close()
+
+
+# Appends fixed-size uint8 tensors to raw shards of shard_size rows. The
+# tensor shape is kept in tensors.json; each shard opens as
+# np.memmap(path, np.uint8, 'r').reshape(-1, height, width, 3) and
+# index.jsonl maps every sample name to its shard and row.
+class MemmapShardWriter:
+    def __init__(self, output_folder, shard_size=1000, tensor_size=(224, 224)):
+        self.output_folder = output_folder
+        self.shard_size = shard_size
+        width, height = tensor_size
+        self.shape = [height, width, 3]
+        info_path = os.path.join(output_folder, TENSOR_INFO_NAME)
+        if os.path.exists(info_path):
+            with open(info_path, encoding='utf-8') as f:
+                existing = json.load(f)
+            if existing['shape'] != self.shape:
+                raise ValueError(f"{output_folder} already holds tensors of shape {existing['shape']}, not {self.shape}")
+        else:
+            with open(info_path, 'w', encoding='utf-8') as f:
+                json.dump({'shape': self.shape, 'dtype': 'uint8'}, f)
+        self._shard_number = _next_shard(output_folder, 'tensors-*.u8')
+        self._file = None
+        self._shard_name = None
+        self._rows = 0
+        self._index = open(os.path.join(output_folder, INDEX_NAME), 'a', encoding='utf-8')
+
+    def _open_shard(self):
+        self._shard_name = f'tensors-{self._shard_number:05d}.u8'
+        self._shard_number += 1
+        self._file = open(os.path.join(self.output_folder, self._shard_name), 'wb')
+        self._rows = 0
+
+    def write(self, name, tensor):
+        if list(tensor.shape) != self.shape or tensor.dtype != np.uint8:
+            raise ValueError(f"Tensor for {name} is {tensor.dtype}{list(tensor.shape)}, expected uint8{self.shape}")
+        if self._file is None or self._rows >= self.shard_size:
+            self._close_shard()
+            self._open_shard()
+        self._file.write(np.ascontiguousarray(tensor).data)
+        self._index.write(json.dumps({'name': name, 'shard': self._shard_name, 'row': self._rows}) + '\n')
+        self._rows += 1
+
+    def _close_shard(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        self._close_shard()
+        self._index.close()
+
+
+def open_writer(output_mode, output_folder, shard_size=1000, tensor_size=(224, 224)):
+    if output_mode == 'files':
+        return FileWriter(output_folder)
+    if output_mode == 'tar':
+        return TarShardWriter(output_folder, shard_size)
+    if output_mode == 'memmap':
+        return MemmapShardWriter(output_folder, shard_size, tensor_size)
+    raise ValueError(f"Unknown output mode {output_mode!r}, expected one of {OUTPUT_MODES}")
@@ -0,0 +1,226 @@
+import argparse
+import functools
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# Local stand-in for Google Images with the markup the scraper relies on:
+# .H8Rx8c thumbnails, a .sFlh5c.FyHeAf.iPVvYb preview image that switches to
+# the full-size URL shortly after a click, an a.YsLeY source link and a
+# .UWuvyf dimensions label. More results are appended as the page is
+# scrolled. /search?q=<query>&n=<results>&batch=<per scroll>&fast=<0|1>
+# &thumb_only=<ratio>; fast=1 wraps thumbnails in /imgres links so the fast
+# path can resolve them without clicking, and thumb_only is the share of
+# results whose preview never leaves the thumbnail (forcing a source-page visit).
+# /saved/<file> serves a saved page from the server's fixture_dir as is.
+SEARCH_PAGE = """<!DOCTYPE html>
+<html><head><title>{title} - Mock Image Search</title>
+<style>
+  body {{ margin: 0; font-family: sans-serif; }}
+  #grid {{ width: 58%; }}
+  .H8Rx8c {{ display: inline-block; width: 180px; height: 135px; margin: 4px; cursor: pointer; }}
+  .H8Rx8c img {{ width: 100%; height: 100%; }}
+  #preview {{ position: fixed; right: 0; top: 0; width: 40%; }}
+  #preview img {{ max-width: 100%; }}
+</style></head>
+<body>
+<div id="grid"></div>
+<div id="preview">
+  <img class="sFlh5c FyHeAf iPVvYb" src="" alt="">
+  <a class="YsLeY" href="">Visit source</a>
+  <span class="UWuvyf"></span>
+</div>
+<script>
+var config = {config};
+var shown = 0;
+var placeholder = "data:image/gif;base64,R0lGODlhAQABAAAAACw=";
+
+function imageUrl(i) {{
+  return "/image/" + config.query + "_" + i + ".jpg?w=" + config.width + "&h=" + config.height;
+}}
+
+function openPreview(i) {{
+  var img = document.querySelector(".sFlh5c.FyHeAf.iPVvYb");
+  img.src = placeholder;
+  img.alt = config.query + " result " + i;
+  document.querySelector("a.YsLeY").href = "/source/" + config.query + "_" + i;
+  document.querySelector(".UWuvyf").textContent = config.width + " x " + config.height;
+  if (config.thumbOnly.indexOf(i) >= 0) return;
+  setTimeout(function () {{ img.src = imageUrl(i); }}, config.previewDelay);
+}}
+
+function addResults() {{
+  var grid = document.getElementById("grid");
+  var end = Math.min(shown + config.batch, config.total);
+  for (var i = shown; i < end; i++) {{
+    var cell = document.createElement("div");
+    cell.className = "H8Rx8c";
+    var img = document.createElement("img");
+    img.src = "/thumb/" + config.query + "_" + i + ".jpg";
+    img.alt = config.query + " result " + i;
+    if (config.fast) {{
+      var link = document.createElement("a");
+      link.href = "/imgres?imgurl=" + encodeURIComponent(location.origin + imageUrl(i)) +
+        "&imgrefurl=" + encodeURIComponent(location.origin + "/source/" + config.query + "_" + i);
+      link.appendChild(img);
+      cell.appendChild(link);
+    }} else {{
+      cell.appendChild(img);
+    }}
+    cell.addEventListener("click", (function (n) {{
+      return function (e) {{ e.preventDefault(); openPreview(n); }};
+    }})(i));
+    grid.appendChild(cell);
+  }}
+  shown = end;
+}}
+
+window.addEventListener("scroll", function () {{
+  if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 200) {{
+    setTimeout(addResults, config.scrollDelay);
+  }}
+}});
+addResults();
+</script>
+</body></html>
+"""
+
+SOURCE_PAGE = """<!DOCTYPE html>
+<html><head><title>Source page {name}</title></head>
+<body>
+<img src="/thumb/logo.jpg" width="64" height="64" alt="logo">
+<h1>{name}</h1>
+<img src="/image/{name}.jpg?w={width}&h={height}" width="{width}" height="{height}" alt="{name}">
+<img src="/thumb/{name}_related.jpg" width="120" height="90" alt="related">
+</body></html>
+"""
+
+
+# Deterministic, visually distinct JPEG per name, so the scraper's
+# duplicate detection does not drop synthetic results
+@functools.lru_cache(maxsize=512)
+def render_jpeg(name, width, height):
+    rng = np.random.default_rng(zlib.crc32(name.encode()))
+    blocks = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    img = Image.fromarray(blocks).resize((width, height), Image.BILINEAR)
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class MockSearchHandler(BaseHTTPRequestHandler):
+    # Set on the server instance: image_latency, page_latency, preview_delay, width, height, fixture_dir
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(parts.query)
+        with server.stats_lock:
+            server.request_count += 1
+
+        if parts.path == "/search":
+            time.sleep(server.page_latency)
+            q = query.get("q", ["bike"])[0]
+            total = int(query.get("n", ["100"])[0])
+            thumb_ratio = float(query.get("thumb_only", ["0"])[0])
+            picker = random.Random(q)
+            config = {
+                "query": urllib.parse.quote(q.replace(" ", "_")),
+                "total": total,
+                "batch": int(query.get("batch", ["20"])[0]),
+                "fast": query.get("fast", ["0"])[0] == "1",
+                "thumbOnly": [i for i in range(total) if picker.random() < thumb_ratio],
+                "previewDelay": int(server.preview_delay * 1000),
+                "scrollDelay": int(server.page_latency * 1000),
+                "width": server.width,
+                "height": server.height,
+            }
+            body = SEARCH_PAGE.format(title=q, config=json.dumps(config))
+            self._send(200, body.encode(), "text/html; charset=utf-8")
+        elif parts.path.startswith("/source/"):
+            time.sleep(server.page_latency)
+            name = parts.path[len("/source/"):]
+            body = SOURCE_PAGE.format(name=name, width=server.width, height=server.height)
+            self._send(200, body.encode(), "text/html; charset=utf-8")
+        elif parts.path.startswith("/thumb/"):
+            name = parts.path[len("/thumb/"):].rsplit(".", 1)[0]
+            self._send(200, render_jpeg("thumb:" + name, 120, 90), "image/jpeg")
+        elif parts.path.startswith("/image/"):
+            time.sleep(server.image_latency)
+            name = parts.path[len("/image/"):].rsplit(".", 1)[0]
+            width = int(query.get("w", [server.width])[0])
+            height = int(query.get("h", [server.height])[0])
+            body = render_jpeg(name, width, height)
+            with server.stats_lock:
+                server.image_bytes += len(body)
+            self._send(200, body, "image/jpeg")
+        elif parts.path.startswith("/saved/") and server.fixture_dir:
+            path = os.path.join(server.fixture_dir, os.path.basename(parts.path))
+            if not os.path.isfile(path):
+                self._send(404, b"not found", "text/plain")
+                return
+            with open(path, "rb") as f:
+                self._send(200, f.read(), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+
+# Start the server on a background thread; port 0 picks a free port
+def start_server(host="127.0.0.1", port=0, image_latency=0.2, page_latency=0.05,
+                 preview_delay=0.3, width=1280, height=960, fixture_dir=None):
+    server = ThreadingHTTPServer((host, port), MockSearchHandler)
+    server.daemon_threads = True
+    server.image_latency = image_latency
+    server.page_latency = page_latency
+    server.preview_delay = preview_delay
+    server.width = width
+    server.height = height
+    server.fixture_dir = fixture_dir
+    server.stats_lock = threading.Lock()
+    server.request_count = 0
+    server.image_bytes = 0
+    thread = threading.Thread(target=server.serve_forever, name="mock-search-server", daemon=True)
+    thread.start()
+    return server
+
+
+def search_url(server, query, results=100, batch=20, fast=False, thumb_only=0.0):
+    host, port = server.server_address[:2]
+    params = urllib.parse.urlencode({
+        "q": query, "n": results, "batch": batch, "fast": int(fast), "thumb_only": thumb_only,
+    })
+    return f"http://{host}:{port}/search?{params}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock image-search site for offline benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--image-latency", type=float, default=0.2, help="seconds before each full-size image response")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="seconds before each HTML page response")
+    parser.add_argument("--preview-delay", type=float, default=0.3, help="seconds until the preview switches to full size")
+    args = parser.parse_args()
+    server = start_server(port=args.port, image_latency=args.image_latency,
+                          page_latency=args.page_latency, preview_delay=args.preview_delay)
+    print(f"Mock search server on {search_url(server, 'bike')}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_search_server import start_server, search_url
+
+# Needs Chrome plus a chromedriver the scraper can find without a network
+# install ($CHROMEDRIVER or the cached path from an earlier run).
+#
+# Status: unverified. The mock server is used by the offline tests in tests/,
+# but this end-to-end run has not been executed with a real browser yet, so
+# there are no recorded baseline numbers. A run in which no browser starts is reported as an error,
+# not as 0 images/sec.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
+
+
+# Last "summary" line of the scraper's metrics.jsonl, or None
+def read_metrics_summary(download_dir):
+    path = os.path.join(download_dir, 'metrics.jsonl')
+    if not os.path.exists(path):
+        return None
+    summary = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get('type') == 'summary':
+                summary = record
+    return summary
+
+
+# Run webscraping.py end to end (process_search_url + download_image) against
+# the mock server and collect throughput, per-stage timings and peak memory
+def run_scraper(server, args, download_dir):
+    urls = [
+        search_url(server, f"bench query {i}", results=args.results, batch=args.batch,
+                   fast=args.fast_path, thumb_only=args.thumb_only)
+        for i in range(args.queries)
+    ]
+    command = [sys.executable, os.path.join(REPO_DIR, 'webscraping.py'),
+               '--download-dir', download_dir,
+               '--max-images', str(args.max_images),
+               '--browser-workers', str(args.browser_workers)]
+    for url in urls:
+        command += ['--search-url', url]
+    if not args.fast_path:
+        command.append('--no-fast-path')
+
+    start = time.perf_counter()
+    completed = subprocess.run(command, cwd=download_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        print(completed.stdout[-4000:])
+        raise SystemExit(f"webscraping.py exited with status {completed.returncode}")
+    if args.verbose:
+        print(completed.stdout)
+    if server.request_count == 0:
+        print(completed.stdout[-4000:])
+        raise SystemExit("The scraper never reached the mock server (no browser or chromedriver?); nothing was measured")
+
+    images = [name for name in os.listdir(download_dir) if name.lower().endswith(IMAGE_EXTENSIONS)]
+    # ru_maxrss is in KB on Linux; covers the scraper process, not the browsers it drives
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        'queries': args.queries,
+        'images': len(images),
+        'seconds': round(elapsed, 2),
+        'images_per_sec': round(len(images) / elapsed, 3) if elapsed else 0.0,
+        'peak_rss_mb': round(peak_rss_mb, 1),
+        'server_requests': server.request_count,
+        'server_image_mb': round(server.image_bytes / 1024 / 1024, 2),
+        'metrics': read_metrics_summary(download_dir),
+    }
+
+
+def print_report(report):
+    print(f"\nImages downloaded: {report['images']} from {report['queries']} queries in {report['seconds']}s")
+    print(f"Throughput:        {report['images_per_sec']} images/sec")
+    print(f"Peak RSS:          {report['peak_rss_mb']} MB (scraper process)")
+    print(f"Server:            {report['server_requests']} requests, {report['server_image_mb']} MB of images")
+    metrics = report['metrics']
+    if metrics:
+        print("\nStage            count    total      p50      p95")
+        for stage, stats in sorted(metrics['stages'].items(), key=lambda item: -item[1]['total']):
+            print(f"{stage:<16} {stats['count']:>5} {stats['total']:>8.2f}s "
+                  f"{stats['p50']*1000:>6.0f}ms {stats['p95']*1000:>6.0f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the scraper offline against a local mock image-search server")
+    parser.add_argument('--queries', type=int, default=2, help="number of search URLs to crawl")
+    parser.add_argument('--results', type=int, default=60, help="results available per query")
+    parser.add_argument('--batch', type=int, default=20, help="results added per scroll")
+    parser.add_argument('--max-images', type=int, default=30, help="downloads to stop at per query")
+    parser.add_argument('--browser-workers', type=int, default=1)
+    parser.add_argument('--fast-path', action='store_true', help="let the scraper resolve results from page data")
+    parser.add_argument('--thumb-only', type=float, default=0.1, help="share of results that need a source-page visit")
+    parser.add_argument('--image-latency', type=float, default=0.2, help="server delay per full-size image (s)")
+    parser.add_argument('--page-latency', type=float, default=0.05, help="server delay per HTML page (s)")
+    parser.add_argument('--preview-delay', type=float, default=0.3, help="delay before the preview shows full size (s)")
+    parser.add_argument('--output', help="also write the report as JSON to this file")
+    parser.add_argument('--verbose', action='store_true', help="print the scraper's own output")
+    args = parser.parse_args()
+
+    server = start_server(image_latency=args.image_latency, page_latency=args.page_latency,
+                          preview_delay=args.preview_delay)
+    try:
+        with tempfile.TemporaryDirectory(prefix='scraper-bench-') as download_dir:
+            report = run_scraper(server, args, download_dir)
+    finally:
+        server.shutdown()
+
+    report['settings'] = vars(args)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,56 @@
+import queue
+import threading
+
+
+# Crawl search URLs with a pool of WebDriver workers. Each worker thread owns
+# its own browser (a separate Chrome process) and pulls URLs from a shared
+# queue until it is empty. process_fn is called as process_fn(driver, url,
+# **kwargs) and must return the number of images downloaded for that URL.
+def crawl_parallel(search_urls, worker_count, create_driver, process_fn, **kwargs):
+    url_queue = queue.Queue()
+    for url in search_urls:
+        url_queue.put(url)
+
+    results = {}
+    results_lock = threading.Lock()
+
+    def worker(worker_id):
+        try:
+            driver = create_driver()
+        except Exception as e:
+            print(f"[worker {worker_id}] Could not start browser: {e}")
+            return
+        try:
+            while True:
+                try:
+                    url = url_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    downloads = process_fn(driver, url, **kwargs)
+                except Exception as e:
+                    print(f"[worker {worker_id}] Error processing {url}: {e}")
+                    downloads = 0
+                with results_lock:
+                    results[url] = downloads
+                print(f"[worker {worker_id}] Downloaded {downloads} images from {url}")
+        finally:
+            driver.quit()
+
+    worker_count = max(1, min(worker_count, len(search_urls)))
+    threads = [
+        threading.Thread(target=worker, args=(i,), name=f"browser-{i}")
+        for i in range(worker_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # URLs left in the queue were never picked up (every browser failed)
+    while not url_queue.empty():
+        url = url_queue.get_nowait()
+        print(f"Not processed (no browser available): {url}")
+
+    # Keep the report in the same order as search_urls
+    return {url: results[url] for url in search_urls if url in results}
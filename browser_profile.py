@@ -0,0 +1,38 @@
+# Lean browser profile: headless, eager page loads and CDP request blocking
+# for everything the scraper never looks at.
+
+# Fonts, media and known ad/tracker hosts, blocked on every tab
+BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg", "*.wav",
+    "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*googletagservices.com*",
+    "*adservice.google.*", "*amazon-adsystem.com*", "*facebook.net*",
+    "*scorecardresearch.com*", "*taboola.com*", "*outbrain.com*", "*criteo.*",
+    "*hotjar.com*", "*adnxs.com*", "*moatads.com*", "*quantserve.com*",
+]
+
+# Source pages are only scraped for image URLs, so their images need not be
+# fetched or decoded at all
+IMAGE_URL_PATTERNS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.bmp", "*.svg", "*.ico",
+]
+
+# Document states that count as loaded with eager page loads: the DOM is
+# parsed, and waiting for "complete" would wait for the subresources after all
+EAGER_READY_STATES = ("interactive", "complete")
+
+
+def apply_lean_options(options):
+    options.page_load_strategy = "eager"
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--mute-audio")
+    options.add_argument("--autoplay-policy=user-gesture-required")
+    return options
+
+
+# Block URL patterns on the current tab; applies to its later requests only
+def block_requests(driver, patterns):
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
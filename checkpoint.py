@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+
+# Progress of one search query as rebuilt from the journal
+class QueryProgress:
+    def __init__(self):
+        self.reached = 0          # thumbnails before this index were processed
+        self.queued = {}          # thumbnail index -> image URL still downloading
+        self.downloaded = set()   # image URLs saved successfully
+        self.done = False
+
+    @property
+    def count(self):
+        return len(self.downloaded)
+
+    # First thumbnail to process on resume: the earliest one whose download
+    # never finished, otherwise the first one not reached yet
+    @property
+    def resume_index(self):
+        if self.queued:
+            return min(min(self.queued), self.reached)
+        return self.reached
+
+
+# Append-only JSON lines journal of crawl progress, so an interrupted run can
+# continue where it stopped. Every line is one event for one query; progress is
+# rebuilt by replaying them. Safe to share between browser and download threads.
+class CrawlJournal:
+    def __init__(self, path, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._progress = {}
+        if resume and os.path.exists(path):
+            self._replay()
+        elif os.path.exists(path):
+            os.remove(path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _replay(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Last line may be cut off if the crash happened mid-write
+                    continue
+                self._apply(event)
+
+    def _apply(self, event):
+        progress = self._progress.setdefault(event["query"], QueryProgress())
+        kind = event["event"]
+        if kind == "reached":
+            progress.reached = max(progress.reached, event["index"])
+        elif kind == "queued":
+            progress.queued[event["index"]] = event["url"]
+        elif kind == "finished":
+            progress.queued.pop(event["index"], None)
+            if event["ok"]:
+                progress.downloaded.add(event["url"])
+        elif kind == "done":
+            progress.done = True
+
+    def _write(self, **event):
+        with self._lock:
+            self._apply(event)
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+    def progress(self, query):
+        with self._lock:
+            return self._progress.setdefault(query, QueryProgress())
+
+    # All thumbnails before index have been handled
+    def record_reached(self, query, index):
+        self._write(event="reached", query=query, index=index)
+
+    # Record a queued download and its outcome once the future completes
+    def track(self, query, index, img_url, future):
+        self._write(event="queued", query=query, index=index, url=img_url)
+
+        def finished(f):
+            ok = not f.cancelled() and f.exception() is None and bool(f.result())
+            self._write(event="finished", query=query, index=index, url=img_url, ok=ok)
+
+        future.add_done_callback(finished)
+        return future
+
+    def finish(self, query):
+        self._write(event="done", query=query)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,149 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+
+# Normalize an image URL so trivial variations map to the same key:
+# lowercase scheme/host, no default port, no fragment, sorted query params.
+def normalize_url(url):
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# 64-bit difference hash (dHash) of a PIL image: near-identical images
+# (resized, recompressed) end up within a few bits of each other
+def perceptual_hash(img):
+    small = img.convert("L").resize((9, 8))
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+# On-disk index of everything already downloaded, shared across runs.
+# Keyed by normalized URL and by content hash (SHA-256 plus a perceptual hash).
+# Safe to use from the download engine's worker threads.
+class DedupIndex:
+    def __init__(self, path, max_phash_distance=4):
+        self.path = path
+        self.max_phash_distance = max_phash_distance
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                added REAL
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                sha256 TEXT PRIMARY KEY,
+                phash TEXT,
+                filename TEXT,
+                added REAL
+            );
+        """)
+        # Claims left by a run that stopped before writing its file
+        self._conn.execute("DELETE FROM images WHERE filename IS NULL")
+        self._conn.commit()
+        # Perceptual hashes are compared by Hamming distance, so keep them in memory
+        self._phashes = [
+            int(row[0], 16)
+            for row in self._conn.execute("SELECT phash FROM images WHERE phash IS NOT NULL")
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def has_url(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM urls WHERE url = ?", (normalize_url(url),)
+            ).fetchone()
+        return row is not None
+
+    def has_content(self, sha256):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM images WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+        return row is not None
+
+    def has_similar(self, phash):
+        with self._lock:
+            return self._has_similar(phash)
+
+    def _has_similar(self, phash):
+        return any(bin(phash ^ known).count("1") <= self.max_phash_distance for known in self._phashes)
+
+    # Check and reserve new content in one step, so two threads downloading the
+    # same image under different URLs cannot both store it. Returns False if the
+    # content (or, given a phash, a near-duplicate) is already known. The claim
+    # is completed by add() once the file is written, or dropped by unclaim().
+    def claim(self, sha256, phash=None):
+        with self._lock:
+            known = self._conn.execute("SELECT 1 FROM images WHERE sha256 = ?", (sha256,)).fetchone()
+            if known is not None or (phash is not None and self._has_similar(phash)):
+                return False
+            self._conn.execute(
+                "INSERT INTO images (sha256, phash, filename, added) VALUES (?, ?, NULL, ?)",
+                (sha256, None if phash is None else f"{phash:016x}", time.time()),
+            )
+            self._conn.commit()
+            if phash is not None:
+                self._phashes.append(phash)
+        return True
+
+    # Drop a claim whose file could not be written
+    def unclaim(self, sha256, phash=None):
+        with self._lock:
+            self._conn.execute("DELETE FROM images WHERE sha256 = ? AND filename IS NULL", (sha256,))
+            self._conn.commit()
+            if phash is not None and phash in self._phashes:
+                self._phashes.remove(phash)
+
+    # Remember a URL without new content, e.g. one whose image was a duplicate
+    def add_url(self, url, sha256=None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, added) VALUES (?, ?, ?)",
+                (normalize_url(url), sha256, time.time()),
+            )
+            self._conn.commit()
+
+    # Record a stored image, completing its claim if claim() was called first
+    def add(self, url, sha256, filename, phash=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, added) VALUES (?, ?, ?)",
+                (normalize_url(url), sha256, now),
+            )
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO images (sha256, phash, filename, added) VALUES (?, ?, ?, ?)",
+                (sha256, None if phash is None else f"{phash:016x}", filename, now),
+            ).rowcount
+            if not inserted:
+                self._conn.execute(
+                    "UPDATE images SET filename = ? WHERE sha256 = ? AND filename IS NULL", (filename, sha256)
+                )
+            self._conn.commit()
+            if inserted and phash is not None:
+                self._phashes.append(phash)
@@ -0,0 +1,74 @@
+# Batched DOM extraction: each helper runs a single execute_script call and
+# returns plain Python data, instead of one WebDriver round-trip per
+# get_attribute / find_element.
+
+# Every <img> on the page as one JSON-like list. width/height are the HTML
+# attributes (0 when missing); naturalWidth/naturalHeight are the decoded size
+# (0 when images are blocked); displayWidth/displayHeight are the layout size.
+PAGE_IMAGES_SCRIPT = """
+return Array.from(document.images).map(function (img) {
+    var box = img.getBoundingClientRect();
+    return {
+        src: img.currentSrc || img.src || "",
+        srcset: img.getAttribute("srcset") || "",
+        alt: img.alt || "",
+        width: parseInt(img.getAttribute("width"), 10) || 0,
+        height: parseInt(img.getAttribute("height"), 10) || 0,
+        naturalWidth: img.naturalWidth || 0,
+        naturalHeight: img.naturalHeight || 0,
+        displayWidth: Math.round(box.width),
+        displayHeight: Math.round(box.height)
+    };
+});
+"""
+
+# Everything process_search_url reads about the preview panel in one call
+PREVIEW_SCRIPT = """
+var img = arguments[0];
+var parent = img.parentElement;
+var source = document.querySelector("a.YsLeY");
+var dimensions = document.querySelector(".UWuvyf");
+return {
+    // Resolved absolute URL, as Selenium's get_attribute("src") returned
+    src: img.currentSrc || img.src || "",
+    alt: img.getAttribute("alt") || "",
+    className: img.getAttribute("class") || "",
+    style: img.getAttribute("style") || "",
+    parentHTML: parent ? parent.outerHTML.slice(0, 200) : null,
+    sourceUrl: source ? source.href : null,
+    dimensions: dimensions ? dimensions.textContent : null
+};
+"""
+
+# What the fast path needs from one results thumbnail: its img src/alt and
+# the href of an enclosing /imgres link, if there is one
+THUMBNAIL_SCRIPT = """
+var el = arguments[0];
+var img = el.tagName === "IMG" ? el : el.querySelector("img");
+var link = el.closest("a[href*='imgres']") || el.querySelector("a[href*='imgres']");
+return {
+    src: img ? (img.currentSrc || img.src || "") : "",
+    alt: img ? (img.alt || "") : "",
+    href: link ? link.getAttribute("href") : ""
+};
+"""
+
+
+def extract_page_images(driver):
+    return driver.execute_script(PAGE_IMAGES_SCRIPT) or []
+
+
+def extract_preview(driver, preview_img):
+    return driver.execute_script(PREVIEW_SCRIPT, preview_img)
+
+
+def extract_thumbnail(driver, thumbnail):
+    return driver.execute_script(THUMBNAIL_SCRIPT, thumbnail)
+
+
+# Size of an image record: the HTML attribute if set, else its natural size,
+# else its layout size (images on source pages are not loaded in lean mode)
+def record_size(record):
+    width = record["width"] or record["naturalWidth"] or record["displayWidth"]
+    height = record["height"] or record["naturalHeight"] or record["displayHeight"]
+    return width, height
@@ -0,0 +1,154 @@
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Background download engine: a bounded thread pool with one pooled
+# requests.Session per host and a cap on concurrent requests per host.
+# Jobs over the per-host cap wait in a queue instead of holding a worker.
+# With a RateLimiter the cap follows the limiter's adaptive per-host window
+# (never above per_host_limit), so hosts that slow down or throttle get fewer
+# simultaneous requests.
+class DownloadEngine:
+    def __init__(self, download_fn, max_workers=8, per_host_limit=4, limiter=None):
+        self.download_fn = download_fn
+        self.per_host_limit = max(1, per_host_limit)
+        self.limiter = limiter
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._active = {}
+        self._waiting = {}
+        self._futures = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def host_of(url):
+        return urllib.parse.urlsplit(url).netloc.lower()
+
+    def limit_for(self, host):
+        if self.limiter is None:
+            return self.per_host_limit
+        return max(1, min(self.per_host_limit, self.limiter.concurrency(host)))
+
+    # One session per host so keep-alive connections get reused
+    def session_for(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.per_host_limit)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+            return session
+
+    # Queue a download; returns a Future resolving to download_fn's result
+    def submit(self, img_url, *args, **kwargs):
+        host = self.host_of(img_url)
+        future = Future()
+        job = (future, img_url, args, kwargs)
+        with self._lock:
+            self._futures.add(future)
+            if self._active.get(host, 0) < self.limit_for(host):
+                self._active[host] = self._active.get(host, 0) + 1
+            else:
+                self._waiting.setdefault(host, deque()).append(job)
+                return future
+        self._dispatch(host, job)
+        return future
+
+    def _dispatch(self, host, job):
+        self._executor.submit(self._run, host, job)
+
+    def _run(self, host, job):
+        future, img_url, args, kwargs = job
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = self.download_fn(img_url, *args, session=self.session_for(host), **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            # Hand freed host slots to queued jobs; the limit may have changed
+            # since, so this can start several jobs or none
+            next_jobs = []
+            with self._lock:
+                self._futures.discard(future)
+                self._active[host] -= 1
+                queue = self._waiting.get(host)
+                limit = self.limit_for(host)
+                while queue and self._active[host] < limit:
+                    next_jobs.append(queue.popleft())
+                    self._active[host] += 1
+            for next_job in next_jobs:
+                self._dispatch(host, next_job)
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._futures)
+
+    # Block until every queued download has finished
+    def drain(self):
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                return
+            wait(futures)
+
+    def close(self):
+        self.drain()
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# Tracks the downloads submitted for one search query so the crawl loop can
+# keep going while files download, without overshooting max_images.
+class DownloadBatch:
+    def __init__(self):
+        self.futures = []
+
+    def add(self, future):
+        self.futures.append(future)
+        return future
+
+    @property
+    def succeeded(self):
+        return sum(1 for f in self.futures if f.done() and not f.exception() and f.result())
+
+    @property
+    def pending(self):
+        return sum(1 for f in self.futures if not f.done())
+
+    # Wait until submitting one more download could still count toward the
+    # limit; returns False once the limit has been reached
+    def wait_for_room(self, limit):
+        while True:
+            succeeded = self.succeeded
+            if succeeded >= limit:
+                return False
+            in_flight = [f for f in self.futures if not f.done()]
+            if succeeded + len(in_flight) < limit:
+                return True
+            wait(in_flight, return_when=FIRST_COMPLETED)
+
+    # Wait for every download in the batch and return the success count
+    def drain(self):
+        wait(self.futures)
+        return self.succeeded
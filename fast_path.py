@@ -0,0 +1,89 @@
+import html as html_lib
+import json
+import re
+import urllib.parse
+
+# Google Images embeds every result in inline script data as consecutive
+# ["url",height,width] arrays: the encrypted-tbn0 thumbnail first, then the
+# original image. Pairing the two lets a thumbnail on the page be mapped to
+# its full-resolution URL without clicking it.
+SCRIPT_PAIR_RE = re.compile(
+    r'\["(https://encrypted-tbn0\.gstatic\.com/images\?(?:[^"\\]|\\.)+)",(\d+),(\d+)\],'
+    r'\["(https?://(?:[^"\\]|\\.)+)",(\d+),(\d+)\]'
+)
+
+# Further on in the same result's data, its "2003" entry holds the source
+# page: [null,"<result id>","<page url>",...]
+SCRIPT_SOURCE_RE = re.compile(r'"2003":\[null,"(?:[^"\\]|\\.)*","(https?:(?:[^"\\]|\\.)+)"')
+
+# Older result markup links each thumbnail to /imgres?imgurl=<image>&imgrefurl=<source page>
+IMGRES_HREF_RE = re.compile(r'href="([^"]*/imgres\?[^"]+)"')
+
+
+# Undo JavaScript string escaping (=, &, \/ ...)
+def _js_unescape(value):
+    try:
+        return json.loads(f'"{value}"')
+    except ValueError:
+        return value
+
+
+# Integer query parameter; 0 when it is missing or not a number
+def _int_param(query, name):
+    try:
+        return int(query.get(name, ["0"])[0] or 0)
+    except ValueError:
+        return 0
+
+
+# Full-size image and source page from an /imgres link, or None
+def parse_imgres_href(href):
+    if not href or "/imgres?" not in href:
+        return None
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(html_lib.unescape(href)).query)
+    img_url = query.get("imgurl", [None])[0]
+    if not img_url:
+        return None
+    return {
+        "url": img_url,
+        "source": query.get("imgrefurl", [None])[0],
+        "width": _int_param(query, "w"),
+        "height": _int_param(query, "h"),
+    }
+
+
+# Every result the page source can resolve, as {thumbnail url: record}. A
+# result's source page is looked for between its image pair and the next one.
+def parse_page_data(page_html):
+    records = {}
+    matches = list(SCRIPT_PAIR_RE.finditer(page_html))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(page_html)
+        source = SCRIPT_SOURCE_RE.search(page_html, match.end(), end)
+        thumb = _js_unescape(match.group(1))
+        records[thumb] = {
+            "url": _js_unescape(match.group(4)),
+            "source": _js_unescape(source.group(1)) if source else None,
+            "height": int(match.group(5)),
+            "width": int(match.group(6)),
+        }
+    return records
+
+
+# Lookup table from thumbnails on the results page to full-size image URLs.
+# Results loaded by scrolling are not in the data parsed earlier, so the
+# caller refreshes it from the current page source when lookups start missing.
+class PageDataIndex:
+    def __init__(self):
+        self.records = {}
+
+    def refresh(self, page_html):
+        self.records.update(parse_page_data(page_html))
+        return len(self.records)
+
+    # thumb is a dict with the thumbnail's img "src" and enclosing link "href"
+    def lookup(self, thumb):
+        record = parse_imgres_href(thumb.get("href"))
+        if record:
+            return record
+        return self.records.get(thumb.get("src"))
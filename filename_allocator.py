@@ -0,0 +1,35 @@
+import os
+import threading
+
+
+# Hands out unique filenames in a directory without probing the filesystem in
+# a loop. The directory is listed once; after that names come from an
+# in-memory index with a per-name counter, and each name is claimed on disk
+# with O_EXCL so parallel downloads (or another process) can never share one.
+class FilenameAllocator:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._taken = {entry.name for entry in os.scandir(directory)}
+        self._counters = {}
+
+    # Reserve "<base>.<ext>" or the next free "<base>_<n>.<ext>"; returns
+    # (filename, filepath, file object opened for binary writing)
+    def open_new(self, base, ext):
+        while True:
+            with self._lock:
+                filename = f"{base}.{ext}"
+                if filename in self._taken:
+                    counter = self._counters.get((base, ext), 1)
+                    while f"{base}_{counter}.{ext}" in self._taken:
+                        counter += 1
+                    filename = f"{base}_{counter}.{ext}"
+                    self._counters[(base, ext)] = counter + 1
+                self._taken.add(filename)
+            filepath = os.path.join(self.directory, filename)
+            try:
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                # Created behind our back (e.g. by another process); try the next name
+                continue
+            return filename, filepath, os.fdopen(fd, 'wb')
@@ -0,0 +1,42 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Return only thumbnails not handed out before and tag them, so each call
+# transfers just the newly rendered elements instead of the whole grid
+NEW_ELEMENTS_SCRIPT = """
+var found = Array.from(document.querySelectorAll(arguments[0] + ":not([data-harvested])"));
+found.forEach(function (el) { el.setAttribute("data-harvested", "1"); });
+return found;
+"""
+
+COUNT_NEW_SCRIPT = """
+return document.querySelectorAll(arguments[0] + ":not([data-harvested])").length;
+"""
+
+
+# Yield (index, element) for every thumbnail matching selector, scrolling the
+# results grid to load more once the current ones are used up. Stops after
+# max_idle_scrolls scrolls in a row bring in nothing new. Since it is a
+# generator, the caller breaking out of its loop (quota met) stops the
+# scrolling too, so the page is never loaded further than needed.
+def harvest_thumbnails(driver, selector, scroll_timeout=3, max_idle_scrolls=3):
+    index = 0
+    idle_scrolls = 0
+    while idle_scrolls < max_idle_scrolls:
+        new_elements = driver.execute_script(NEW_ELEMENTS_SCRIPT, selector) or []
+        if new_elements:
+            idle_scrolls = 0
+            print(f"Found {len(new_elements)} new image thumbnails")
+            for element in new_elements:
+                yield index, element
+                index += 1
+            continue
+
+        # Nothing new: scroll to the bottom and wait for the grid to grow
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        try:
+            WebDriverWait(driver, scroll_timeout, poll_frequency=0.2).until(
+                lambda d: d.execute_script(COUNT_NEW_SCRIPT, selector) > 0
+            )
+        except TimeoutException:
+            idle_scrolls += 1
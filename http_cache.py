@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+import requests
+
+from dedup_index import normalize_url
+from image_validation import ImageRejected, read_body
+from rate_limit import get_with_retries
+
+# Failures while the body is streaming; what arrived so far is kept for a Range resume
+BODY_EXCEPTIONS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+)
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
+
+
+# The server kept answering with a range that does not continue the saved bytes
+class RangeMismatch(requests.exceptions.RequestException):
+    pass
+
+
+# Strong ETag or Last-Modified of a response, usable as an If-Range validator
+def validator_of(response):
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("Last-Modified")
+
+
+# ETag / Last-Modified per image URL, so a recrawl can ask the server whether
+# an image it already has changed (304 Not Modified) instead of fetching it
+# again. Only URLs whose image was stored are recorded. Thread-safe.
+class HttpCache:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                checked REAL
+            )
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, checked FROM validators WHERE url = ?", (normalize_url(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "checked": row[2]}
+
+    # True when the URL was checked within max_age seconds, or cannot be
+    # revalidated at all (no validators); either way it is not worth a request
+    def is_fresh(self, url, max_age):
+        entry = self.get(url)
+        if entry is None or max_age is None:
+            return True
+        return time.time() - entry["checked"] < max_age
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, checked) VALUES (?, ?, ?, ?)",
+                (normalize_url(url), etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    # A 304 confirmed the stored image is current
+    def touch(self, url):
+        with self._lock:
+            self._conn.execute("UPDATE validators SET checked = ? WHERE url = ?", (time.time(), normalize_url(url)))
+            self._conn.commit()
+
+
+# Bodies of interrupted downloads, kept as <hash>.part files (plus a small
+# JSON sidecar with the validator they were fetched under) so the next
+# attempt, in this run or a later one, asks only for the missing bytes.
+class PartialDownloads:
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.folder, hashlib.sha1(normalize_url(url).encode()).hexdigest() + ".part")
+
+    def _meta(self, url):
+        try:
+            with open(self._path(url) + ".json", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # Range / If-Range headers for a saved partial body; empty if there is none.
+    # If-Range makes the server send the whole image instead if it has changed.
+    def resume_headers(self, url):
+        meta = self._meta(url)
+        path = self._path(url)
+        if not meta or not meta.get("validator") or not os.path.exists(path):
+            return {}
+        size = os.path.getsize(path)
+        if size == 0:
+            return {}
+        return {"Range": f"bytes={size}-", "If-Range": meta["validator"]}
+
+    # Buffer to read the response body into: pre-filled with the saved bytes
+    # when the server answered a Range request with the matching 206, empty
+    # (and the stale partial dropped) for a full response. A 206 starting at
+    # byte 0 to a request without Range counts as a full response. None if
+    # the 206 does not continue the saved bytes; the partial is dropped then too.
+    def start_buffer(self, url, response, ranged=True):
+        buffer = BytesIO()
+        if response.status_code == 206:
+            match = CONTENT_RANGE_RE.match(response.headers.get("Content-Range", ""))
+            if match and not ranged and int(match.group(1)) == 0:
+                self.discard(url)
+                return buffer
+            path = self._path(url)
+            if not ranged or not match or not os.path.exists(path) or int(match.group(1)) != os.path.getsize(path):
+                self.discard(url)
+                return None
+            with open(path, "rb") as f:
+                buffer.write(f.read())
+        else:
+            self.discard(url)
+        return buffer
+
+    def save(self, url, data, response):
+        validator = validator_of(response)
+        if not validator or not len(data):
+            return
+        path = self._path(url)
+        with open(path, "wb") as f:
+            f.write(data)
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump({"url": url, "validator": validator}, f)
+
+    def discard(self, url):
+        path = self._path(url)
+        for name in (path, path + ".json"):
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+
+
+# GET a body into memory through the rate limiter, resuming from a saved
+# partial with a Range request and saving a new partial if the transfer breaks
+# off. Interrupted bodies and 206s that do not continue the saved bytes are
+# retried up to limiter.max_retries times in all; after that the last error
+# (or RangeMismatch) is raised. Returns (response, body); body is None when
+# the status is not 200/206 or accept(response) is False. ImageRejected from
+# read_body (body too large) is passed on.
+def fetch_resumable(http, url, limiter, partials, headers, max_bytes, metrics=None, accept=None, **kwargs):
+    attempt = 0
+    while True:
+        resume = partials.resume_headers(url)
+        response = get_with_retries(http, url, limiter, metrics, headers={**headers, **resume}, **kwargs)
+        if response.status_code not in (200, 206) or (accept and not accept(response)):
+            return response, None
+        buffer = partials.start_buffer(url, response, ranged=bool(resume))
+        if buffer is None:
+            # Mismatched range: start over with a plain request
+            response.close()
+            if attempt >= limiter.max_retries:
+                raise RangeMismatch(f"unexpected Content-Range {response.headers.get('Content-Range')!r} for {url}")
+            attempt += 1
+            if metrics:
+                metrics.count("retry.range_mismatch")
+            continue
+        if buffer.tell() and metrics:
+            metrics.count("resumed")
+            metrics.count("bytes_resumed", buffer.tell())
+        try:
+            data = read_body(response, max_bytes, buffer=buffer)
+        except ImageRejected:
+            partials.discard(url)
+            raise
+        except BODY_EXCEPTIONS:
+            partials.save(url, buffer.getbuffer(), response)
+            if attempt >= limiter.max_retries:
+                raise
+            attempt += 1
+            if metrics:
+                metrics.count("retry.body_interrupted")
+            continue
+        partials.discard(url)
+        return response, data
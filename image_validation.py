@@ -0,0 +1,69 @@
+from io import BytesIO
+
+from PIL import Image
+
+# Magic bytes at the start of each supported format, with the extension to save it under
+MAGIC_BYTES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+]
+
+
+# reason is a short code for metrics (e.g. "too_small"); the message is for people
+class ImageRejected(Exception):
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+
+# File extension for the image format in the first bytes, or None if it is not an image
+def sniff_image_type(head):
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for magic, ext in MAGIC_BYTES:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+# Read a streamed response body into memory, refusing anything over max_bytes.
+# A buffer that already holds the start of the body (resumed download) can be
+# passed in; it keeps whatever arrived if the transfer fails part way.
+def read_body(response, max_bytes, chunk_size=65536, buffer=None):
+    buffer = buffer if buffer is not None else BytesIO()
+    declared = int(response.headers.get("Content-Length") or 0) + buffer.tell()
+    if max_bytes and declared > max_bytes:
+        raise ImageRejected("too_large", f"too large ({declared/1024:.1f} KB)")
+    for chunk in response.iter_content(chunk_size):
+        buffer.write(chunk)
+        if max_bytes and buffer.tell() > max_bytes:
+            raise ImageRejected("too_large", f"too large (over {max_bytes/1024:.1f} KB)")
+    return buffer.getbuffer()
+
+
+# Validate an in-memory image before anything is written to disk: magic bytes,
+# then the header (format and size), then a full decode to catch truncated
+# files. JPEGs are decoded as small greyscale drafts: the whole stream is still
+# read, but only what the perceptual hash needs is kept. Returns (ext, decoded
+# PIL image, (width, height) of the full image); raises ImageRejected otherwise.
+def validate_image_bytes(data, min_width=0, min_height=0):
+    ext = sniff_image_type(bytes(data[:16]))
+    if ext is None:
+        raise ImageRejected("not_image", "not an image (unknown magic bytes)")
+    try:
+        img = Image.open(BytesIO(data))
+    except Exception as e:
+        raise ImageRejected("bad_header", f"unreadable header: {e}")
+    width, height = img.size
+    if width < min_width or height < min_height:
+        raise ImageRejected("too_small", f"too small ({width}x{height})")
+    if img.format == "JPEG":
+        img.draft("L", (64, 64))
+    try:
+        img.load()
+    except Exception as e:
+        raise ImageRejected("truncated", f"truncated or corrupt: {e}")
+    return ext, img, (width, height)
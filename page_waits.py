@@ -0,0 +1,56 @@
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Selector for the large image shown in the preview panel after a click
+PREVIEW_SELECTOR = ".sFlh5c.FyHeAf.iPVvYb"
+
+
+# Wait until the current document has reached one of ready_states. A freshly
+# opened tab reports "complete" for about:blank, so that does not count as
+# loaded. Returns False if the timeout runs out; the caller just scrapes what
+# is there.
+def wait_for_page_ready(driver, timeout, ready_states=("complete",)):
+    def page_ready(d):
+        if d.current_url in ("", "about:blank"):
+            return False
+        return d.execute_script("return document.readyState") in ready_states
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(page_ready)
+        return True
+    except TimeoutException:
+        return False
+
+
+# Current src of the preview image, or None if no preview is open yet
+def current_preview_src(driver):
+    try:
+        for img in driver.find_elements(By.CSS_SELECTOR, PREVIEW_SELECTOR):
+            src = img.get_attribute("src")
+            if src:
+                return src
+    except StaleElementReferenceException:
+        pass
+    return None
+
+
+def is_full_res_src(src):
+    return bool(src) and not src.startswith("data:") and not src.startswith("https://encrypted-tbn0")
+
+
+# Wait for the preview panel to show a new full-resolution image after a
+# thumbnail click, i.e. its src differs from previous_src and is no longer a
+# data: URL or a Google thumbnail. Raises TimeoutException like WebDriverWait.
+def wait_for_preview(driver, previous_src, timeout):
+    def preview_loaded(d):
+        try:
+            for img in d.find_elements(By.CSS_SELECTOR, PREVIEW_SELECTOR):
+                src = img.get_attribute("src")
+                if src != previous_src and is_full_res_src(src):
+                    return img
+        except StaleElementReferenceException:
+            pass
+        return False
+
+    return WebDriverWait(driver, timeout, poll_frequency=0.1).until(preview_loaded)
@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from augment_manifest import content_key
+from augment_writer import open_writer
+from dedup_index import sha256_bytes
+from rotate import augment_bytes, image_seed
+
+
+# Streams downloaded images straight into augmentation while the scrape is
+# still running. Image bytes go from the downloader to a process pool without
+# being re-read from disk. At most max_pending images are queued or being
+# augmented; past that, submit() blocks the calling download thread
+# (backpressure) until a worker frees a slot. With output_mode "tar" or
+# "memmap" the workers hand back encoded samples and this process appends
+# them to the shards (see rotate.py for the output settings).
+class AugmentPipeline:
+    def __init__(self, output_folder, workers=None, max_pending=32, base_seed=0,
+                 output_mode="files", output_format="jpeg", output_quality=90,
+                 shard_size=1000, tensor_size=(224, 224)):
+        self.output_folder = output_folder
+        self.base_seed = base_seed
+        self.options = {"output_mode": output_mode, "output_format": output_format,
+                        "output_quality": output_quality, "tensor_size": tensor_size}
+        os.makedirs(output_folder, exist_ok=True)
+        self._writer = (open_writer(output_mode, output_folder, shard_size, tensor_size)
+                        if output_mode != "files" else None)
+        # spawn, not fork: the scraper is multi-threaded when workers start
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.success_count = 0
+        self.error_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Queue one downloaded image; blocks while the queue is full. Outputs are
+    # named after the image's content (as in rotate.py's incremental mode), so
+    # later runs into the same folder add to it instead of overwriting it.
+    # sha256 is the hex digest of data when the caller already has it.
+    def submit(self, data, name, sha256=None):
+        key = content_key(sha256 or sha256_bytes(data))
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(
+                augment_bytes, data, self.output_folder, key,
+                image_seed(key, self.base_seed), name, **self.options,
+            )
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        ok = not future.cancelled() and future.exception() is None and future.result()
+        with self._lock:
+            if ok:
+                self.success_count += 1
+                if self._writer:
+                    for sample_name, payload in ok:
+                        self._writer.write(sample_name, payload)
+            else:
+                self.error_count += 1
+        self._slots.release()
+
+    # Wait for queued images to finish and stop the worker processes
+    def close(self):
+        self._pool.shutdown(wait=True)
+        if self._writer:
+            self._writer.close()
+        return self.success_count, self.error_count
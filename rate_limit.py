@@ -0,0 +1,176 @@
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+
+import requests
+
+# Responses that mean "slow down / try again later"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Network errors worth retrying
+RETRY_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+
+def host_of(url):
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+# Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None
+def parse_retry_after(value, now=None):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time.time()))
+
+
+# Per-host pacing state: a token bucket refilled at `rate` requests per second,
+# a concurrency window and a "do not send before" time set by backoffs
+class HostState:
+    def __init__(self, rate, burst, concurrency):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.window = float(concurrency)
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.latency = None
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+# Adaptive per-host rate limiter. Every request first takes a token from its
+# host's bucket. Successes that come back faster than target_latency slowly
+# raise the host's rate and concurrency window (additive increase); 429/5xx
+# responses, timeouts and slow responses cut them (multiplicative decrease) and
+# failures push the host back with exponential backoff plus jitter, or for as
+# long as the server's Retry-After asks. min_delay is an optional politeness
+# floor: a host is never sent requests more often than every min_delay
+# seconds, however fast it answers (it caps max_rate and disables bursts).
+# Thread-safe.
+class RateLimiter:
+    def __init__(self, rate=5.0, burst=5, min_rate=0.5, max_rate=50.0,
+                 concurrency=4, min_concurrency=1, max_concurrency=8,
+                 target_latency=3.0, base_delay=0.5, max_delay=60.0, max_retries=3, min_delay=0.0):
+        if min_delay > 0:
+            max_rate = min(max_rate, 1 / min_delay)
+            burst = 1
+        self.initial_rate = min(rate, max_rate)
+        self.burst = burst
+        self.min_rate = min(min_rate, max_rate)
+        self.max_rate = max_rate
+        self.initial_concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState(self.initial_rate, self.burst, self.initial_concurrency)
+        return state
+
+    # Block until the URL's host may be sent another request
+    def acquire(self, url):
+        host = host_of(url)
+        while True:
+            with self._lock:
+                state = self._state(host)
+                now = time.monotonic()
+                state.refill(now)
+                if now >= state.blocked_until and state.tokens >= 1:
+                    state.tokens -= 1
+                    return
+                delay = max(state.blocked_until - now, (1 - state.tokens) / state.rate)
+            time.sleep(delay)
+
+    # Concurrent requests currently allowed to the host
+    def concurrency(self, host):
+        with self._lock:
+            return int(self._state(host).window)
+
+    # Full-jitter exponential backoff for the given (0-based) retry attempt
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_success(self, url, latency):
+        with self._lock:
+            state = self._state(host_of(url))
+            state.failures = 0
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            if state.latency > self.target_latency:
+                # Server is slowing down: ease off before it starts refusing
+                state.window = max(self.min_concurrency, state.window - 1 / state.window)
+                state.rate = max(self.min_rate, state.rate * 0.9)
+            else:
+                state.window = min(self.max_concurrency, state.window + 1 / state.window)
+                state.rate = min(self.max_rate, state.rate + 0.1)
+
+    # Record a throttled/failed request; returns the delay the server asked for
+    # (Retry-After) or our own backoff. The host is held back for that long, but
+    # never more than max_delay, so one long Retry-After cannot stall every
+    # later request to the host.
+    def record_failure(self, url, retry_after=None):
+        with self._lock:
+            state = self._state(host_of(url))
+            if retry_after is not None:
+                delay = retry_after
+            else:
+                delay = min(self.max_delay, self.backoff_delay(state.failures))
+            state.failures += 1
+            state.window = max(self.min_concurrency, state.window / 2)
+            state.rate = max(self.min_rate, state.rate / 2)
+            state.tokens = min(state.tokens, 0)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + min(delay, self.max_delay))
+            return delay
+
+
+# GET through the limiter, retrying 429/5xx responses and timeouts/connection
+# errors up to limiter.max_retries times. Returns the last response (which may
+# still be an error status) or raises the last network error. A Retry-After
+# longer than limiter.max_delay is not retried: the error response is returned
+# at once and the host is only held back for max_delay. Retries and backoff
+# time are reported to metrics when given.
+def get_with_retries(http, url, limiter, metrics=None, **kwargs):
+    attempt = 0
+    while True:
+        limiter.acquire(url)
+        start = time.monotonic()
+        try:
+            response = http.get(url, **kwargs)
+        except RETRY_EXCEPTIONS as e:
+            delay = limiter.record_failure(url)
+            if attempt >= limiter.max_retries:
+                raise
+            reason = type(e).__name__
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                limiter.record_success(url, time.monotonic() - start)
+                return response
+            delay = limiter.record_failure(url, parse_retry_after(response.headers.get('Retry-After')))
+            if attempt >= limiter.max_retries or delay > limiter.max_delay:
+                return response
+            response.close()
+            reason = f"status_{response.status_code}"
+        attempt += 1
+        if metrics:
+            metrics.count(f"retry.{reason}")
+            metrics.observe("backoff", delay)
+        # The host is blocked for `delay`; acquire() does the waiting
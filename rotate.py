@@ -1,72 +1,361 @@
 import cv2
 import numpy as np
 import os
-import random
+import argparse
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageEnhance
 import logging
+from io import BytesIO
+from image_validation import sniff_image_type
+from augment_manifest import AugmentManifest, file_sha256, content_key
+from augment_writer import OUTPUT_EXTENSIONS, OUTPUT_MODES, FileWriter, encode_image, open_writer, to_tensor
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-input_folder = "/home/san/Desktop/selenium/downloaded_images"
+# Defaults for the command line (see main()); importing this module has no side effects
+input_folder = "downloaded_images"
 output_folder = "scooter"
 
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
+# Number of worker processes (1 = run serially) and images handed to a worker at a time
+workers = os.cpu_count() or 1
+chunksize = 16
+
+# Incremental mode: only augment inputs that are new or changed since the last
+# run (tracked in a manifest in the output folder), and name outputs after the
+# input's content instead of its position in the folder listing
+incremental = True
+
+# Images are decoded at reduced size so their longest side is at most max_side
+# (None keeps full size); images that would still need more than
+# max_image_memory_mb for their working copies are skipped
+max_side = 2048
+max_image_memory_mb = 256
+
+# Extensions considered at all; the file's magic bytes must also match an image
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+
+# Roughly how many full-size RGB copies augmentation keeps alive at once: the
+# decoded image and its array, the fused backend's two uint8 scratch buffers
+# and the copy the encoder makes of the flipped view
+WORKING_COPIES = 5
+
+# Augmentation backend: "pil" runs a separate PIL pass per output, "fused"
+# converts the image to an array once and uses cv2 lookup tables, views and
+# warpAffine with per-worker reusable buffers (same outputs within a small tolerance)
+augment_backend = "fused"
+
+# Where augmented samples go: "files" writes one file per sample, "tar" packs
+# them into WebDataset-style tar shards and "memmap" into shards of fixed-size
+# uint8 tensors (resized to tensor_size, width x height); both archive modes
+# hold shard_size samples per shard and list every sample in index.jsonl
+output_mode = "files"
+shard_size = 1000
+tensor_size = (224, 224)
+
+# Every encoded sample uses the same format and quality ("jpeg", "png" or "webp")
+output_format = "jpeg"
+output_quality = 90
+
+# Base seed for the noise augmentation; each image gets its own seed derived from it
+seed = 0
+
+ROTATION_ANGLES = [-30, -15, 15, 30]
+
+# Sample keys augment_image produces for one input, in the order the
+# augmentation functions yield them
+def output_keys(index):
+    keys = [f"rotated_{index}_{angle}" for angle in ROTATION_ANGLES]
+    return keys + [f"contrast_{index}", f"bright_{index}", f"flip_{index}", f"noise_{index}"]
+
+# Sample names for one input: files / tar members carry the format's
+# extension, memmap rows are named by key alone
+def output_names(index, output_mode="files", output_format="jpeg"):
+    if output_mode == "memmap":
+        return output_keys(index)
+    return [f"{key}.{OUTPUT_EXTENSIONS[output_format]}" for key in output_keys(index)]
+
+# Stable per-image seed, so the same input always gets the same noise no
+# matter which worker process handles it or in which order
+def image_seed(img_name, base_seed=0):
+    digest = hashlib.sha256(f"{base_seed}:{img_name}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+# Yield (name, path) for image files in a folder without listing it up front;
+# files are filtered by extension, then by their magic bytes
+def scan_images(input_folder):
+    with os.scandir(input_folder) as entries:
+        for entry in entries:
+            if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    head = f.read(16)
+            except OSError:
+                continue
+            if sniff_image_type(head):
+                yield entry.name, entry.path
+
+# Open an image and decode it at reduced size: JPEGs are decoded straight at
+# 1/2, 1/4 or 1/8 scale via draft(), then the result is shrunk to max_side.
+# Raises MemoryError if the decode would exceed max_memory_mb.
+def load_image(img_path, max_side=max_side, max_memory_mb=max_image_memory_mb):
+    img = Image.open(img_path)
+    width, height = img.size
+    limit = max_side or max(width, height)
+    if max_memory_mb:
+        # Shrink further if the working copies at max_side would not fit the budget
+        budget_pixels = max_memory_mb * 1024 * 1024 / (3 * WORKING_COPIES)
+        scale = min(1.0, (budget_pixels / (width * height)) ** 0.5)
+        limit = min(limit, int(max(width, height) * scale))
+    if img.format == 'JPEG':
+        img.draft('RGB', (limit, limit))
+    elif max_memory_mb and width * height * 4 > max_memory_mb * 1024 * 1024:
+        # Only JPEG can be decoded at reduced size; others decode at full size first
+        raise MemoryError(f"{width}x{height} {img.format} exceeds the {max_memory_mb} MB decode budget")
+    
+    # Convert to RGB mode to ensure compatibility with JPEG format
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if max(img.size) > limit:
+        img.thumbnail((limit, limit), Image.LANCZOS, reducing_gap=2.0)
+    return img
+
+# Original augmentation: one PIL pass (and copy) per output. Yields the
+# augmented images in output_keys order.
+def augment_pil(img, rng):
+    # Rotation
+    for angle in ROTATION_ANGLES:
+        yield img.rotate(angle)
+
+    # Contrast
+    contrast = ImageEnhance.Contrast(img)
+    yield contrast.enhance(1.5)  # Increase contrast
+
+    # Brightness
+    bright = ImageEnhance.Brightness(img)
+    yield bright.enhance(1.2)  # Slightly increase brightness
+
+    # Flipping
+    yield img.transpose(Image.FLIP_LEFT_RIGHT)
+
+    # Adding Noise
+    img_np = np.array(img)
+    noise = rng.integers(0, 50, img_np.shape, dtype=np.uint8)
+    yield cv2.add(img_np, noise)
+
+# Scratch arrays reused across images within one worker process, keyed by name
+_buffers = {}
+
+def _buffer(name, shape, dtype):
+    size = int(np.prod(shape))
+    buffer = _buffers.get(name)
+    if buffer is None or buffer.dtype != dtype or buffer.size < size:
+        buffer = _buffers[name] = np.empty(size, dtype=dtype)
+    return buffer[:size].reshape(shape)
+
+# 256-entry table mapping each value v to clip(offset + factor * v)
+def _linear_lut(factor, offset=0.0):
+    values = np.arange(256, dtype=np.float32) * factor + offset
+    return np.clip(values, 0, 255).astype(np.uint8)
 
-def augment_image(img_path, output_folder, index):
+# Fused augmentation on an RGB uint8 array: brightness and contrast are one
+# table lookup each, the flip is a view, rotations use warpAffine into a
+# reused buffer and the noise is generated into reused buffers. Yields the
+# same images as augment_pil; each one is only valid until the next is requested.
+def augment_array(arr, rng):
+    height, width = arr.shape[:2]
+
+    # Rotation, matching PIL's rotate(): counter-clockwise about the image
+    # centre, nearest neighbour, black fill
+    center = (width / 2 - 0.5, height / 2 - 0.5)
+    rotated = _buffer("rotated", arr.shape, np.uint8)
+    for angle in ROTATION_ANGLES:
+        matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+        cv2.warpAffine(arr, matrix, (width, height), dst=rotated, flags=cv2.INTER_NEAREST,
+                       borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        yield rotated
+
+    # Contrast around the mean grey level, like ImageEnhance.Contrast(1.5)
+    adjusted = _buffer("adjusted", arr.shape, np.uint8)
+    mean = int(cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY).mean() + 0.5)
+    cv2.LUT(arr, _linear_lut(1.5, mean * (1 - 1.5)), dst=adjusted)
+    yield adjusted
+
+    # Brightness, like ImageEnhance.Brightness(1.2)
+    cv2.LUT(arr, _linear_lut(1.2), dst=adjusted)
+    yield adjusted
+
+    # Flipping is a view; the encoder reads it directly
+    yield arr[:, ::-1]
+
+    # Noise in [0, 50), drawn straight into the rotation buffer (no longer
+    # needed) with cv2's generator seeded from rng, and added with saturation
+    noise = rotated
+    cv2.setRNGSeed(int(rng.integers(2 ** 31 - 1)))
+    cv2.randu(noise, (0, 0, 0), (50, 50, 50))
+    cv2.add(arr, noise, dst=adjusted)
+    yield adjusted
+
+# img_path may also be a file-like object; name is what gets logged for it.
+# In "files" mode the samples are written to output_folder and True is
+# returned; in the archive modes the (name, payload) samples are returned for
+# the caller's shard writer: encoded bytes for "tar", uint8 tensors for "memmap".
+# Returns False on error.
+def augment_image(img_path, output_folder, index, seed=None, name=None,
+                  max_side=max_side, max_memory_mb=max_image_memory_mb, backend=augment_backend,
+                  output_mode="files", output_format=output_format, output_quality=output_quality,
+                  tensor_size=tensor_size):
+    name = name or img_path
     try:
-        img = Image.open(img_path)
-        
-        # Convert to RGB mode to ensure compatibility with JPEG format
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # Rotation
-        angles = [-30, -15, 15, 30]
-        for angle in angles:
-            img_rotated = img.rotate(angle)
-            img_rotated.save(f"{output_folder}/rotated_{index}_{angle}.jpg")
-
-        # Contrast
-        contrast = ImageEnhance.Contrast(img)
-        img_contrast = contrast.enhance(1.5)  # Increase contrast
-        img_contrast.save(f"{output_folder}/contrast_{index}.jpg")
-
-        # Brightness
-        bright = ImageEnhance.Brightness(img)
-        img_bright = bright.enhance(1.2)  # Slightly increase brightness
-        img_bright.save(f"{output_folder}/bright_{index}.jpg")
-
-        # Flipping
-        img_flip = img.transpose(Image.FLIP_LEFT_RIGHT)
-        img_flip.save(f"{output_folder}/flip_{index}.jpg")
-
-        # Adding Noise
-        img_np = np.array(img)
-        noise = np.random.randint(0, 50, img_np.shape, dtype='uint8')
-        img_noisy = cv2.add(img_np, noise)
-        cv2.imwrite(f"{output_folder}/noise_{index}.jpg", img_noisy)
+        rng = np.random.default_rng(seed)
+        img = load_image(img_path, max_side, max_memory_mb)
+        if backend == "fused":
+            images = augment_array(np.asarray(img), rng)
+        else:
+            images = augment_pil(img, rng)
+
+        writer = FileWriter(output_folder) if output_mode == "files" else None
+        samples = []
+        for sample_name, image in zip(output_names(index, output_mode, output_format), images):
+            if output_mode == "memmap":
+                samples.append((sample_name, to_tensor(image, tensor_size)))
+                continue
+            data = encode_image(image, output_format, output_quality)
+            if writer:
+                writer.write(sample_name, data)
+            else:
+                samples.append((sample_name, data))
         
-        logging.info(f"Successfully processed image: {img_path}")
-        return True
+        logging.info(f"Successfully processed image: {name}")
+        return samples if output_mode != "files" else True
+    except Exception as e:
+        logging.error(f"Error processing image {name}: {str(e)}")
+        return False
+
+# Augment an image that is already in memory, e.g. handed over by the downloader
+def augment_bytes(data, output_folder, index, seed=None, name=None, **options):
+    return augment_image(BytesIO(data), output_folder, index, seed, name or f"<memory {index}>", **options)
+
+# Top-level wrapper so tasks can be sent to worker processes; options holds
+# augment_image's keyword settings (max_side, max_memory_mb, backend, output_*)
+def augment_task(task):
+    img_path, output_folder, index, img_seed, options = task
+    try:
+        return augment_image(img_path, output_folder, index, img_seed, **options)
     except Exception as e:
-        logging.error(f"Error processing image {img_path}: {str(e)}")
+        logging.error(f"Error with file {img_path}: {str(e)}")
         return False
 
-# Process all images
-success_count = 0
-error_count = 0
-for idx, img_name in enumerate(os.listdir(input_folder)):
-    img_path = os.path.join(input_folder, img_name)
+def build_tasks(input_folder, output_folder, base_seed=0, options=None):
+    for idx, (img_name, img_path) in enumerate(scan_images(input_folder)):
+        yield img_path, output_folder, idx, image_seed(img_name, base_seed), options or {}
+
+# Like build_tasks, but only for inputs the manifest does not already cover.
+# Outputs are keyed by content hash. Returns (tasks, pending) where pending
+# maps each task's key to the (name, stat, sha256) entries to record once it succeeds.
+def build_incremental_tasks(manifest, input_folder, output_folder, base_seed=0, options=None):
+    tasks = []
+    pending = {}
+    skipped = 0
+    for img_name, img_path in scan_images(input_folder):
+        stat = os.stat(img_path)
+        if manifest.is_unchanged(img_name, stat):
+            skipped += 1
+            continue
+        sha256 = file_sha256(img_path)
+        key = content_key(sha256)
+        # Touched, renamed or duplicate file whose content was already augmented
+        if manifest.has_content(sha256):
+            manifest.record(img_name, stat, sha256, manifest.outputs_for(sha256))
+            skipped += 1
+            continue
+        if key not in pending:
+            tasks.append((img_path, output_folder, key, image_seed(key, base_seed), options or {}))
+            pending[key] = []
+        pending[key].append((img_name, stat, sha256))
+    logging.info(f"Incremental mode: {len(tasks)} new or changed images, {skipped} already augmented")
+    return tasks, pending
+
+# Augment every image in input_folder, serially or on a pool of worker
+# processes; returns (success_count, error_count). In the archive output
+# modes workers return encoded samples and this process appends them to the
+# shards, so shards are written sequentially by one writer.
+def process_folder(input_folder, output_folder, workers=1, chunksize=16, base_seed=0,
+                   max_side=max_side, max_memory_mb=max_image_memory_mb, incremental=False,
+                   backend=augment_backend, output_mode="files", output_format=output_format,
+                   output_quality=output_quality, shard_size=shard_size, tensor_size=tensor_size):
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    options = {"max_side": max_side, "max_memory_mb": max_memory_mb, "backend": backend,
+               "output_mode": output_mode, "output_format": output_format,
+               "output_quality": output_quality, "tensor_size": tensor_size}
+    manifest = AugmentManifest(output_folder, {**options, "seed": base_seed}) if incremental else None
+    if manifest:
+        tasks, pending = build_incremental_tasks(manifest, input_folder, output_folder, base_seed, options)
+    else:
+        tasks = list(build_tasks(input_folder, output_folder, base_seed, options))
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and tasks else None
+    writer = open_writer(output_mode, output_folder, shard_size, tensor_size) if output_mode != "files" else None
+    success_count = 0
+    error_count = 0
     try:
-        if os.path.isfile(img_path):
-            if augment_image(img_path, output_folder, idx):
+        if pool:
+            results = pool.map(augment_task, tasks, chunksize=chunksize)
+        else:
+            results = map(augment_task, tasks)
+        for task, ok in zip(tasks, results):
+            if ok:
                 success_count += 1
+                if writer:
+                    for sample_name, payload in ok:
+                        writer.write(sample_name, payload)
+                if manifest:
+                    key = task[2]
+                    for img_name, stat, sha256 in pending[key]:
+                        manifest.record(img_name, stat, sha256, output_names(key, output_mode, output_format))
             else:
                 error_count += 1
-    except Exception as e:
-        logging.error(f"Error with file {img_path}: {str(e)}")
-        error_count += 1
+    finally:
+        if pool:
+            pool.shutdown()
+        if writer:
+            writer.close()
+        if manifest:
+            manifest.save()
+    return success_count, error_count
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Augment a folder of images (rotations, contrast, brightness, flip, noise)")
+    parser.add_argument('input_folder', nargs='?', default=input_folder, help=f"images to augment (default: {input_folder})")
+    parser.add_argument('output_folder', nargs='?', default=output_folder, help=f"where to write outputs (default: {output_folder})")
+    parser.add_argument('--workers', type=int, default=workers, help="worker processes (1 runs serially)")
+    parser.add_argument('--chunksize', type=int, default=chunksize, help="images handed to a worker at a time")
+    parser.add_argument('--seed', type=int, default=seed, help="base seed for the noise augmentation")
+    parser.add_argument('--max-side', type=int, default=max_side, help="longest side images are decoded at (0 keeps full size)")
+    parser.add_argument('--max-memory-mb', type=int, default=max_image_memory_mb, help="per-image decode budget")
+    parser.add_argument('--incremental', dest='incremental', action='store_true', default=incremental,
+                        help="only augment new or changed inputs" + (" (default)" if incremental else ""))
+    parser.add_argument('--full', dest='incremental', action='store_false',
+                        help="augment every input, not only new or changed ones" + ("" if incremental else " (default)"))
+    parser.add_argument('--backend', choices=["fused", "pil"], default=augment_backend)
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default=output_mode)
+    parser.add_argument('--format', choices=sorted(OUTPUT_EXTENSIONS), default=output_format)
+    parser.add_argument('--quality', type=int, default=output_quality)
+    parser.add_argument('--shard-size', type=int, default=shard_size, help="samples per tar/memmap shard")
+    parser.add_argument('--tensor-size', type=int, nargs=2, default=tensor_size, metavar=('WIDTH', 'HEIGHT'),
+                        help="memmap tensor size")
+    return parser
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    # Process all images
+    success_count, error_count = process_folder(args.input_folder, args.output_folder, args.workers, args.chunksize,
+                                                args.seed, args.max_side or None, args.max_memory_mb,
+                                                args.incremental, args.backend, args.output_mode, args.format,
+                                                args.quality, args.shard_size, tuple(args.tensor_size))
+    logging.info(f"Processing complete. Successfully processed {success_count} images. Failed to process {error_count} images.")
+    return success_count, error_count
 
-logging.info(f"Processing complete. Successfully processed {success_count} images. Failed to process {error_count} images.")
+if __name__ == "__main__":
+    main()
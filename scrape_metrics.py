@@ -0,0 +1,98 @@
+import functools
+import math
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+
+# Nearest-rank percentile of an already sorted list
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+# Per-stage timers and counters for a scrape run. Every observation is
+# appended to a JSON lines file (if a path is given) and kept in memory for
+# the end-of-run summary with p50/p95 latencies. Thread-safe.
+class Metrics:
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._durations = defaultdict(list)
+        self._counters = Counter()
+        self._start = time.time()
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def _emit(self, record):
+        if self._file:
+            record["ts"] = round(time.time(), 3)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._durations[stage].append(seconds)
+            self._emit({"type": "timing", "stage": stage, "seconds": round(seconds, 4)})
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+            self._emit({"type": "counter", "name": name, "value": value})
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    # Decorator form of timer() for whole functions
+    def timed(self, stage):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def summary(self):
+        with self._lock:
+            stages = {}
+            for stage, values in self._durations.items():
+                values = sorted(values)
+                stages[stage] = {
+                    "count": len(values),
+                    "total": round(sum(values), 3),
+                    "p50": round(percentile(values, 50), 4),
+                    "p95": round(percentile(values, 95), 4),
+                }
+            return {
+                "elapsed": round(time.time() - self._start, 3),
+                "stages": stages,
+                "counters": dict(self._counters),
+            }
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\nRun time: {summary['elapsed']:.1f}s")
+        for stage, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["total"]):
+            print(f"  {stage:<16} n={stats['count']:<6} total={stats['total']:.1f}s "
+                  f"p50={stats['p50']*1000:.0f}ms p95={stats['p95']*1000:.0f}ms")
+        for name, value in sorted(summary["counters"].items()):
+            print(f"  {name:<32} {value}")
+
+    # Write the summary as the last line of the metrics file
+    def close(self):
+        summary = self.summary()
+        with self._lock:
+            if self._file:
+                self._emit({"type": "summary", **summary})
+                self._file.close()
+                self._file = None
+        return summary
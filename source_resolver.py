@@ -0,0 +1,143 @@
+import urllib.parse
+
+import requests
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException
+
+from browser_profile import block_requests
+from dom_extract import extract_page_images, record_size
+from page_waits import wait_for_page_ready
+
+# Images smaller than this on both sides are treated as icons, logos, etc.
+MIN_SOURCE_IMAGE_SIDE = 300
+
+# Only this much of a source page is downloaded for the plain HTTP attempt
+MAX_SOURCE_HTML_BYTES = 2 * 1024 * 1024
+
+HTML_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml;q=0.9,*/*;q=0.8',
+}
+
+
+def _int_attr(tag, name):
+    try:
+        return int(str(tag.get(name, "0")).strip().rstrip("px") or 0)
+    except ValueError:
+        return 0
+
+
+# Largest candidate from a parsed page: og:image / twitter:image when the page
+# declares one, otherwise the biggest <img> by its width/height attributes
+def find_image_in_html(page_html, base_url):
+    soup = BeautifulSoup(page_html, "lxml")
+    for attrs in ({"property": "og:image"}, {"name": "twitter:image"}, {"property": "og:image:url"}):
+        meta = soup.find("meta", attrs=attrs)
+        if meta and meta.get("content"):
+            return urllib.parse.urljoin(base_url, meta["content"].strip())
+
+    best, best_area = None, 0
+    for img in soup.find_all("img"):
+        src = img.get("src") or img.get("data-src")
+        if not src or src.startswith("data:"):
+            continue
+        width, height = _int_attr(img, "width"), _int_attr(img, "height")
+        if (width > MIN_SOURCE_IMAGE_SIDE or height > MIN_SOURCE_IMAGE_SIDE) and width * height > best_area:
+            best, best_area = urllib.parse.urljoin(base_url, src), width * height
+    return best
+
+
+# Largest image from the records returned by extract_page_images
+def pick_largest_image(images):
+    large_images = []
+    for img in images:
+        width, height = record_size(img)
+        src = img["src"]
+        # Only consider reasonably sized images with a valid src
+        if src and not src.startswith("data:") and (width > MIN_SOURCE_IMAGE_SIDE or height > MIN_SOURCE_IMAGE_SIDE):
+            large_images.append((width * height, src))
+    if not large_images:
+        return None
+    return max(large_images)[1]
+
+
+# Finds the main image on a result's source page. A plain HTTP fetch and HTML
+# parse is tried first; only pages that need JavaScript fall back to the
+# browser, which reuses one dedicated tab instead of opening and closing a
+# window per image. Call close() when done to drop the tab.
+class SourcePageResolver:
+    def __init__(self, driver, page_timeout=8, http_timeout=10, block_patterns=None, session=None,
+                 ready_states=("complete",)):
+        self.driver = driver
+        self.page_timeout = page_timeout
+        self.ready_states = ready_states
+        self.http_timeout = http_timeout
+        self.block_patterns = block_patterns
+        self.session = session or requests.Session()
+        self._tab = None
+        self._main = None
+
+    # Returns (image URL or None, "http" / "browser" / None)
+    def resolve(self, source_url):
+        img_url = self.resolve_http(source_url)
+        if img_url:
+            return img_url, "http"
+        img_url = self.resolve_browser(source_url)
+        if img_url:
+            return img_url, "browser"
+        return None, None
+
+    def resolve_http(self, source_url):
+        try:
+            with self.session.get(source_url, headers=HTML_HEADERS, timeout=self.http_timeout, stream=True) as response:
+                if response.status_code != 200 or 'html' not in response.headers.get('Content-Type', ''):
+                    return None
+                body = bytearray()
+                for chunk in response.iter_content(65536):
+                    body += chunk
+                    if len(body) >= MAX_SOURCE_HTML_BYTES:
+                        break
+            page_html = bytes(body).decode(response.encoding or 'utf-8', errors='replace')
+            return find_image_in_html(page_html, response.url)
+        except Exception as e:
+            print(f"Plain HTTP fetch of source page failed: {e}")
+            return None
+
+    def _switch_to_tab(self):
+        driver = self.driver
+        self._main = driver.current_window_handle
+        if self._tab not in driver.window_handles:
+            driver.execute_script("window.open('about:blank');")
+            self._tab = [h for h in driver.window_handles if h != self._main][-1]
+            driver.switch_to.window(self._tab)
+            # Request blocking is per tab, so it only has to be set up once
+            if self.block_patterns:
+                block_requests(driver, self.block_patterns)
+        else:
+            driver.switch_to.window(self._tab)
+
+    def resolve_browser(self, source_url):
+        driver = self.driver
+        self._switch_to_tab()
+        try:
+            # Load the page and wait for it; on timeout scrape whatever has loaded
+            try:
+                driver.get(source_url)
+                wait_for_page_ready(driver, self.page_timeout, self.ready_states)
+            except TimeoutException:
+                print("Source page load timed out, using what has loaded")
+            return pick_largest_image(extract_page_images(driver))
+        except Exception as e:
+            print(f"Error finding image on source page: {e}")
+            return None
+        finally:
+            driver.switch_to.window(self._main)
+
+    def close(self):
+        if self._tab and self._tab in self.driver.window_handles:
+            main = self._main or self.driver.window_handles[0]
+            self.driver.switch_to.window(self._tab)
+            self.driver.close()
+            self.driver.switch_to.window(main)
+        self._tab = None
+        self.session.close()
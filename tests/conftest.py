@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules under test are top-level scripts, not an installed package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmark")]
@@ -0,0 +1,41 @@
+import numpy as np
+from PIL import Image
+
+from rotate import ROTATION_ANGLES, augment_array, augment_pil
+
+
+def synthetic_image(width=97, height=64):
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1).astype(np.uint8)
+    pixels[10:30, 20:50] = np.random.default_rng(0).integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def outputs(backend_outputs):
+    # The fused backend reuses its buffers, so copy each output before the next
+    return [np.array(image) for image in backend_outputs]
+
+
+def test_fused_backend_matches_pil():
+    img = synthetic_image()
+    fused = outputs(augment_array(np.asarray(img), np.random.default_rng(1)))
+    pil = outputs(augment_pil(img, np.random.default_rng(1)))
+    assert len(fused) == len(pil) == len(ROTATION_ANGLES) + 4
+    assert all(a.shape == b.shape and a.dtype == b.dtype for a, b in zip(fused, pil))
+
+    rotations = len(ROTATION_ANGLES)
+    for angle, a, b in zip(ROTATION_ANGLES, fused[:rotations], pil[:rotations]):
+        # Nearest-neighbour sampling may pick a neighbouring pixel along edges
+        mismatch = np.any(a != b, axis=-1).mean()
+        assert mismatch < 0.01, f"rotation {angle}: {mismatch:.2%} of pixels differ"
+
+    contrast, bright, flip = range(rotations, rotations + 3)
+    for i in (contrast, bright, flip):
+        np.testing.assert_array_equal(fused[i], pil[i])
+
+    # Noise comes from different generators; both add [0, 50) with saturation
+    original = np.asarray(img).astype(int)
+    for noisy in (fused[-1], pil[-1]):
+        added = noisy.astype(int) - original
+        assert added.min() >= 0 and added.max() <= 49
+        assert 20 < added[noisy < 255].mean() < 29
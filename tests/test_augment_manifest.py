@@ -0,0 +1,55 @@
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from augment_writer import INDEX_NAME
+from rotate import process_folder
+
+
+def make_inputs(folder, seeds):
+    os.makedirs(folder, exist_ok=True)
+    for name, seed in seeds.items():
+        pixels = np.random.default_rng(seed).integers(0, 256, (60, 80, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(folder, name))
+
+
+def index_names(folder):
+    with open(os.path.join(folder, INDEX_NAME), encoding='utf-8') as f:
+        return [json.loads(line)['name'] for line in f]
+
+
+def test_changed_output_settings_are_augmented_again(tmp_path):
+    inputs, outputs = str(tmp_path / 'in'), str(tmp_path / 'out')
+    make_inputs(inputs, {'a.jpg': 1, 'b.jpg': 2})
+    assert process_folder(inputs, outputs, incremental=True) == (2, 0)
+    assert process_folder(inputs, outputs, incremental=True) == (0, 0)
+    jpgs = [name for name in os.listdir(outputs) if name.endswith('.jpg')]
+    assert len(jpgs) == 16
+
+    assert process_folder(inputs, outputs, incremental=True, output_mode='tar', output_format='png') == (2, 0)
+    # The files the old settings made are replaced by shard members
+    assert not [name for name in os.listdir(outputs) if name.endswith('.jpg')]
+    assert len(index_names(outputs)) == 16
+    assert process_folder(inputs, outputs, incremental=True, output_mode='tar', output_format='png') == (0, 0)
+
+    # Same names written again with another quality: one index line each
+    assert process_folder(inputs, outputs, incremental=True, output_mode='tar', output_format='png',
+                          output_quality=80) == (2, 0)
+    names = index_names(outputs)
+    assert len(names) == len(set(names)) == 16
+
+
+def test_changed_input_drops_stale_shard_members_from_the_index(tmp_path):
+    inputs, outputs = str(tmp_path / 'in'), str(tmp_path / 'out')
+    make_inputs(inputs, {'a.jpg': 1, 'b.jpg': 2})
+    process_folder(inputs, outputs, incremental=True, output_mode='tar')
+    old_names = set(index_names(outputs))
+
+    make_inputs(inputs, {'b.jpg': 3})
+    assert process_folder(inputs, outputs, incremental=True, output_mode='tar') == (1, 0)
+    names = index_names(outputs)
+    assert len(names) == len(set(names)) == 16
+    # a.jpg's members survive, b.jpg's old ones are gone
+    assert len(old_names & set(names)) == 8
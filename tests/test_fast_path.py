@@ -0,0 +1,63 @@
+import os
+import urllib.request
+
+import pytest
+
+from fast_path import PageDataIndex, parse_imgres_href, parse_page_data
+from mock_search_server import start_server
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+# The saved results page, fetched from the mock server the way the browser would
+@pytest.fixture(scope="module")
+def results_page():
+    server = start_server(fixture_dir=FIXTURES)
+    try:
+        host, port = server.server_address[:2]
+        with urllib.request.urlopen(f"http://{host}:{port}/saved/results_page.html") as response:
+            yield response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_script_data_pairs_thumbnails_with_images_and_sources(results_page):
+    records = parse_page_data(results_page)
+    assert len(records) == 3
+    assert records["https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR1&s=10"] == {
+        "url": "https://cdn.example.com/bikes/390-adventure.jpg",
+        "source": "https://www.example.com/reviews/ktm-390-adventure?ref=images",
+        "height": 1080,
+        "width": 1440,
+    }
+    # Escaped quotes stay in the URL; no "2003" entry means no source page
+    second = records["https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR2&s=10"]
+    assert second["url"] == 'https://img.example.net/250-duke_"studio".png'
+    assert second["source"] is None
+    third = records["https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR3&s=10"]
+    assert third["source"] == "http://bikes.example.in/ktm/125-duke"
+
+
+def test_lookup_prefers_imgres_link_then_script_data(results_page):
+    index = PageDataIndex()
+    assert index.refresh(results_page) == 3
+    record = index.lookup({
+        "src": "https://encrypted-tbn0.gstatic.com/images?q=tbn:imgres1",
+        "href": "/imgres?imgurl=https%3A%2F%2Fcdn.example.org%2Fduke-200.jpg&amp;"
+                "imgrefurl=https%3A%2F%2Fexample.org%2Fduke-200&amp;w=1280&amp;h=960",
+    })
+    assert record == {"url": "https://cdn.example.org/duke-200.jpg", "source": "https://example.org/duke-200",
+                      "width": 1280, "height": 960}
+    record = index.lookup({"src": "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcR3&s=10", "href": None})
+    assert record["url"] == "http://bikes.example.in/125duke.jpg"
+    # Unknown thumbnails fall back to clicking
+    assert index.lookup({"src": "https://encrypted-tbn0.gstatic.com/images?q=tbn:other", "href": None}) is None
+
+
+def test_imgres_href_with_bad_dimensions_still_resolves():
+    record = parse_imgres_href("/imgres?imgurl=https%3A%2F%2Fcdn.example.org%2Frc-390.jpg&w=auto&h=960px")
+    assert record["url"] == "https://cdn.example.org/rc-390.jpg"
+    assert (record["width"], record["height"]) == (0, 0)
+    assert parse_imgres_href("/imgres?imgrefurl=https%3A%2F%2Fexample.org") is None
+    assert parse_imgres_href("https://example.org/page") is None
@@ -0,0 +1,124 @@
+import collections
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_cache import HttpCache, PartialDownloads, RangeMismatch, fetch_resumable
+from rate_limit import RateLimiter
+
+BODY = bytes(range(256)) * 4096
+ETAG = '"v1"'
+
+
+# /full206: every GET gets "206 bytes 0-.../N" with the whole body
+# /offset206: every GET gets a 206 that never starts where the client asked
+# /flaky: the first plain GET breaks off halfway, Range requests are honoured
+# /cached: 304 when If-None-Match matches
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _headers(self, status, length, extra=()):
+        self.send_response(status)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", ETAG)
+        for name, value in extra:
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path].append(dict(self.headers))
+            count = len(server.requests[self.path])
+        if self.path == "/full206":
+            self._headers(206, len(BODY), [("Content-Range", f"bytes 0-{len(BODY) - 1}/{len(BODY)}")])
+            self.wfile.write(BODY)
+        elif self.path == "/offset206":
+            self._headers(206, len(BODY) - 5, [("Content-Range", f"bytes 5-{len(BODY) - 1}/{len(BODY)}")])
+            self.wfile.write(BODY[5:])
+        elif self.path == "/flaky":
+            range_header = self.headers.get("Range")
+            if range_header and self.headers.get("If-Range") == ETAG:
+                start = int(range_header[len("bytes="):].rstrip("-"))
+                self._headers(206, len(BODY) - start,
+                              [("Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}")])
+                self.wfile.write(BODY[start:])
+            elif count == 1:
+                self._headers(200, len(BODY))
+                self.wfile.write(BODY[:len(BODY) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+            else:
+                self._headers(200, len(BODY))
+                self.wfile.write(BODY)
+        elif self.path == "/cached":
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+            else:
+                self._headers(200, len(BODY))
+                self.wfile.write(BODY)
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = collections.defaultdict(list)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    server.base = f"http://{host}:{port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, partials, headers=None):
+    limiter = RateLimiter(rate=1000, burst=1000, max_retries=2)
+    with requests.Session() as http:
+        return fetch_resumable(http, url, limiter, partials, headers or {}, None, stream=True, timeout=5)
+
+
+def test_206_from_byte_zero_without_range_is_a_full_body(server, tmp_path):
+    response, data = fetch(server.base + "/full206", PartialDownloads(str(tmp_path)))
+    assert response.status_code == 206
+    assert bytes(data) == BODY
+    assert len(server.requests["/full206"]) == 1
+
+
+def test_range_mismatch_is_retried_a_bounded_number_of_times(server, tmp_path):
+    with pytest.raises(RangeMismatch):
+        fetch(server.base + "/offset206", PartialDownloads(str(tmp_path)))
+    assert len(server.requests["/offset206"]) == 3
+
+
+def test_interrupted_body_resumes_with_range(server, tmp_path):
+    response, data = fetch(server.base + "/flaky", PartialDownloads(str(tmp_path)))
+    assert bytes(data) == BODY
+    first, second = server.requests["/flaky"]
+    assert "Range" not in first
+    # Only whole chunks that arrived before the break are kept
+    resumed_at = int(second["Range"][len("bytes="):].rstrip("-"))
+    assert 0 < resumed_at <= len(BODY) // 2
+    assert second["If-Range"] == ETAG
+    # The finished download leaves no partial behind
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stored_validators_turn_a_refetch_into_304(server, tmp_path):
+    url = server.base + "/cached"
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite"))
+    partials = PartialDownloads(str(tmp_path / "partial"))
+    response, data = fetch(url, partials)
+    cache.store(url, response)
+    response, data = fetch(url, partials, cache.conditional_headers(url))
+    assert response.status_code == 304 and data is None
+    assert server.requests["/cached"][1]["If-None-Match"] == ETAG
+    cache.close()
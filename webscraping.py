@@ -1,110 +1,41 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
+import argparse
+import functools
+import threading
+import time
 import requests
 import urllib.parse
-from PIL import Image
-from io import BytesIO
 import re
+from download_engine import DownloadEngine, DownloadBatch
+from scrape_metrics import Metrics
+from filename_allocator import FilenameAllocator
+from dedup_index import DedupIndex, perceptual_hash, sha256_bytes
+from image_validation import ImageRejected, validate_image_bytes
+from page_waits import wait_for_page_ready, current_preview_src, wait_for_preview
+from rate_limit import RateLimiter
+from http_cache import HttpCache, PartialDownloads, fetch_resumable
+from browser_pool import crawl_parallel
+from dom_extract import extract_preview, extract_thumbnail
+from source_resolver import SourcePageResolver
+from fast_path import PageDataIndex
+from checkpoint import CrawlJournal
+from harvester import harvest_thumbnails
+from browser_profile import apply_lean_options, block_requests, BLOCKED_URL_PATTERNS, EAGER_READY_STATES, IMAGE_URL_PATTERNS
+from selenium.common.exceptions import TimeoutException
 
-# Create a directory to save images if it doesn't exist
-download_dir = os.path.join(os.getcwd(), 'downloaded_images')
-os.makedirs(download_dir, exist_ok=True)
-print(f"Images will be saved to: {download_dir}")
-
-# Properly initialize the WebDriver with options to avoid detection
-options = webdriver.ChromeOptions()
-options.add_argument('--disable-blink-features=AutomationControlled')
-options.add_argument('--start-maximized')
-service = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=service, options=options)
-
-# Function to clean filename
-def clean_filename(filename):
-    # Remove invalid characters for filenames
-    return re.sub(r'[\\/*?:"<>|]', "", filename)
-
-# Function to download image
-def download_image(img_url, img_alt, index):
-    try:
-        # Create a filename from the alt text or use the index if alt is empty
-        if img_alt and len(img_alt.strip()) > 0:
-            filename = clean_filename(img_alt)[:50]  # Limit filename length
-        else:
-            filename = f"image_{index}"
-        
-        # Get file extension from URL or default to jpg
-        if '.' in img_url.split('/')[-1]:
-            try:
-                ext = img_url.split('/')[-1].split('.')[-1].lower()
-                # Only use valid image extensions
-                if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp']:
-                    pass
-                else:
-                    ext = 'jpg'  # Default to jpg for unknown extensions
-            except:
-                ext = 'jpg'
-        else:
-            ext = 'jpg'
-            
-        # Add extension
-        filename = f"{filename}.{ext}"
-        filepath = os.path.join(download_dir, filename)
-        
-        # Check if file already exists, add number if it does
-        counter = 1
-        original_filename = filename
-        while os.path.exists(filepath):
-            filename = f"{original_filename.split('.')[0]}_{counter}.{ext}"
-            filepath = os.path.join(download_dir, filename)
-            counter += 1
-        
-        # Download the image
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
-        }
-        response = requests.get(img_url, stream=True, timeout=15, headers=headers)
-        
-        if response.status_code == 200:
-            # Check if it's actually an image
-            content_type = response.headers.get('Content-Type', '')
-            if 'image' in content_type:
-                # Get file size
-                file_size = int(response.headers.get('Content-Length', 0))
-                print(f"Image size: {file_size/1024:.1f} KB")
-                
-                # Save the image
-                with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(8192):  # Larger chunks for faster download
-                        f.write(chunk)
-                        
-                # Verify the downloaded file is valid
-                try:
-                    with Image.open(filepath) as img:
-                        width, height = img.size
-                        print(f"Downloaded: {filename} ({width}x{height})")
-                        return True
-                except Exception as e:
-                    print(f"Downloaded file is not a valid image: {e}")
-                    # Remove invalid file
-                    os.remove(filepath)
-                    return False
-            else:
-                print(f"Not an image content type: {content_type}")
-        else:
-            print(f"Failed to download image: {response.status_code}")
-    except Exception as e:
-        print(f"Error downloading image: {e}")
-    return False
+# Importing this module has no side effects: nothing is created, installed or
+# launched until ImageScraper.open()/run() (or the command line, see main()).
+#
+#     with ImageScraper("downloads", max_images=50) as scraper:
+#         scraper.run([search_url_for("ktm bike india")])
 
-# List of search URLs to process
-search_urls = [
+# Default search URLs when none are given
+DEFAULT_SEARCH_URLS = [
     # "https://www.google.com/search?q=hero+scooter+image&tbm=isch",
     # "https://www.google.com/search?q=honda+scooter+india&tbm=isch",
     # "https://www.google.com/search?q=tvs+scooter+models&tbm=isch",
@@ -117,185 +48,547 @@ search_urls = [
 
 ]
 
-# Function to process a single search URL
-def process_search_url(url, max_images=100):
-    print(f"\n{'='*50}")
-    print(f"Processing search URL: {url}")
-    print(f"{'='*50}\n")
-    
-    # Open Google Images search
-    driver.get(url)
-    
-    # Wait for the page to load
-    time.sleep(3)
-    print("Page title:", driver.title)
-    
-    # Find all thumbnail images
-    thumbnails = WebDriverWait(driver, 10).until(
-        EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".H8Rx8c"))
-    )
-    
-    print(f"Found {len(thumbnails)} image thumbnails")
-    
-    # Track successful downloads for this URL
-    successful_downloads = 0
-    
-    # Process each thumbnail
-    for index, thumbnail in enumerate(thumbnails):
-        # Stop if we've reached the maximum number of images
-        if successful_downloads >= max_images:
-            print(f"Reached maximum of {max_images} successful downloads for this URL")
-            break
-            
+DOWNLOAD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
+}
+
+# Where the chromedriver path from the last install is remembered between runs
+DRIVER_PATH_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'webscraping', 'chromedriver_path')
+
+
+# Google Images search URL for a plain-text query
+def search_url_for(query):
+    return f"https://www.google.com/search?q={urllib.parse.quote_plus(query)}&tbm=isch"
+
+
+# chromedriver binary: $CHROMEDRIVER if set, else the path installed by an
+# earlier run (no network call), else a fresh webdriver-manager install whose
+# path is remembered. Resolved once per process; refresh=True reinstalls.
+# The lock makes browsers started in parallel wait for the first lookup
+# instead of each running its own install.
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path(refresh=False):
+    with _driver_path_lock:
+        return _chromedriver_path(refresh)
+
+
+@functools.lru_cache(maxsize=None)
+def _chromedriver_path(refresh):
+    env_path = os.environ.get('CHROMEDRIVER')
+    if env_path and os.path.exists(env_path):
+        return env_path
+    if not refresh and os.path.exists(DRIVER_PATH_CACHE):
+        with open(DRIVER_PATH_CACHE, encoding='utf-8') as f:
+            cached = f.read().strip()
+        if cached and os.path.exists(cached):
+            return cached
+    from webdriver_manager.chrome import ChromeDriverManager
+    path = ChromeDriverManager().install()
+    os.makedirs(os.path.dirname(DRIVER_PATH_CACHE), exist_ok=True)
+    with open(DRIVER_PATH_CACHE, 'w', encoding='utf-8') as f:
+        f.write(path)
+    return path
+
+
+# Function to clean filename
+def clean_filename(filename):
+    # Remove invalid characters for filenames
+    return re.sub(r'[\\/*?:"<>|]', "", filename)
+
+
+# Reuters serves higher quality when asked; other URLs are returned unchanged
+def best_quality_url(img_url):
+    if "reuters.com/resizer" in img_url and "&quality=" in img_url:
+        print("Found Reuters high-resolution image!")
+        img_url = re.sub(r'&quality=\d+', '&quality=100', img_url)
+        print(f"Modified to highest quality: {img_url[:100]}...")
+    return img_url
+
+
+# Downloads images from Google Images searches into download_dir. The class
+# attributes below are the tuning defaults and can be overridden per instance.
+# Constructing a scraper is free; open() creates the download folder and the
+# on-disk indexes, and browsers (and the chromedriver lookup) only start in run().
+# download_image() works without any browser, e.g. in tests.
+class ImageScraper:
+    # Timeout budgets (seconds) for the condition-based waits that replace fixed sleeps
+    page_load_timeout = 10
+    preview_timeout = 5
+    source_page_timeout = 8
+
+    # Infinite scroll: how long to wait for more thumbnails after a scroll, and how
+    # many fruitless scrolls in a row end the query
+    scroll_timeout = 3
+    max_idle_scrolls = 3
+
+    # Fast path: page data is re-read at most every N thumbnails
+    fast_path_refresh_every = 20
+
+    # Adaptive per-host rate limiting for downloads and page loads: each host starts
+    # at request_rate requests/second and host_concurrency parallel downloads, then
+    # speeds up while responses stay fast and backs off on 429/5xx, timeouts and
+    # slow responses (honouring Retry-After); failed requests are retried up to
+    # max_retries times with exponential backoff and jitter
+    request_rate = 5.0
+    host_concurrency = 4
+    max_retries = 3
+    # Optional minimum delay (seconds) between requests to the same host; 0 for none
+    min_host_delay = 0.0
+
+    # In-memory validation limits: largest body to buffer and smallest accepted resolution
+    max_image_bytes = 25 * 1024 * 1024
+    min_image_width = 100
+    min_image_height = 100
+
+    # URLs already downloaded are revalidated with a conditional request once
+    # they are older than revalidate_after seconds (None never revalidates)
+    revalidate_after = 7 * 24 * 3600
+
+    # Augmentation while scraping (enabled by passing augment_dir)
+    augment_workers = os.cpu_count()
+    augment_queue_size = 32
+    # "files", or "tar" / "memmap" shards (see rotate.py)
+    augment_output_mode = "files"
+
+    # download_workers is the total download threads and per_host_limit the most
+    # simultaneous requests per host the adaptive limiter may ramp up to.
+    # browser_workers browsers crawl search URLs in parallel; lean mode runs them
+    # headless with eager page loads and blocks fonts, media, ads and trackers
+    # (plus all images on source pages, where only their URLs are needed).
+    def __init__(self, download_dir=None, max_images=100, browser_workers=4, download_workers=8,
+                 per_host_limit=8, use_fast_path=True, lean_browser=True, resume=False,
+                 augment_dir=None, driver_path=None):
+        self.download_dir = download_dir or os.path.join(os.getcwd(), 'downloaded_images')
+        self.max_images = max_images
+        self.browser_workers = browser_workers
+        self.download_workers = download_workers
+        self.per_host_limit = per_host_limit
+        self.use_fast_path = use_fast_path
+        self.lean_browser = lean_browser
+        self.headless = lean_browser
+        # Eager page loads stop at "interactive", so that is all the waits look for
+        self.ready_states = EAGER_READY_STATES if lean_browser else ("complete",)
+        self.resume = resume
+        self.augment_dir = augment_dir
+        self.driver_path = driver_path
+        self.augment_pipeline = None
+        self._opened = False
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Create the download folder, indexes, journal and download engine
+    def open(self):
+        if self._opened:
+            return self
+        download_dir = self.download_dir
+        os.makedirs(download_dir, exist_ok=True)
+        print(f"Images will be saved to: {download_dir}")
+
+        # Per-stage timings and counters, appended as JSON lines and summarized at the end
+        self.metrics = Metrics(os.path.join(download_dir, 'metrics.jsonl'))
+        self.limiter = RateLimiter(rate=self.request_rate, concurrency=self.host_concurrency,
+                                   max_concurrency=self.per_host_limit, max_retries=self.max_retries,
+                                   min_delay=self.min_host_delay)
+        # Allocates unique filenames in download_dir from an in-memory index
+        self.allocator = FilenameAllocator(download_dir)
+        # Per-query crawl progress, so an interrupted run can be resumed
+        self.journal = CrawlJournal(os.path.join(download_dir, 'crawl_journal.jsonl'), resume=self.resume)
+        # Persistent index of downloaded URLs and image hashes, shared across runs
+        self.dedup = DedupIndex(os.path.join(download_dir, 'dedup_index.sqlite'))
+        # ETag / Last-Modified of stored images; interrupted transfers are kept as
+        # .part files and resumed with Range requests
+        self.http_cache = HttpCache(os.path.join(download_dir, 'http_cache.sqlite'))
+        self.partials = PartialDownloads(os.path.join(download_dir, '.partial'))
+        # Background download engine shared by all queries
+        self.engine = DownloadEngine(self.download_image, max_workers=self.download_workers,
+                                     per_host_limit=self.per_host_limit, limiter=self.limiter)
+        if self.augment_dir:
+            # Imported here so the scraper does not load the augmentation stack unless asked
+            from pipeline import AugmentPipeline
+            self.augment_pipeline = AugmentPipeline(self.augment_dir, self.augment_workers, self.augment_queue_size,
+                                                    output_mode=self.augment_output_mode)
+        self._opened = True
+        return self
+
+    # Wait for queued downloads (and augmentation) to finish and release everything
+    def close(self):
+        if not self._opened:
+            return
+        self._opened = False
+        self.engine.close()
+        self.dedup.close()
+        self.http_cache.close()
+        self.journal.close()
+        self.metrics.close()
+        if self.augment_pipeline:
+            augmented, failed = self.augment_pipeline.close()
+            print(f"Augmented {augmented} images ({failed} failed) into {self.augment_dir}")
+            self.augment_pipeline = None
+
+    # Properly initialize a WebDriver with options to avoid detection
+    def create_driver(self):
+        options = webdriver.ChromeOptions()
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        if self.headless:
+            options.add_argument('--headless=new')
+            options.add_argument('--window-size=1920,1080')
+        else:
+            options.add_argument('--start-maximized')
+        if self.lean_browser:
+            apply_lean_options(options)
+        # Every browser in the pool reuses the same chromedriver binary
+        driver_path = self.driver_path or chromedriver_path()
+        driver = webdriver.Chrome(service=Service(driver_path), options=options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        if self.lean_browser:
+            block_requests(driver, BLOCKED_URL_PATTERNS)
+        return driver
+
+    # Process the search URLs with a pool of browsers; each worker closes its own
+    # browser. Returns {search URL: images downloaded}.
+    def run(self, search_urls=None):
+        self.open()
+        return crawl_parallel(search_urls or DEFAULT_SEARCH_URLS, self.browser_workers, self.create_driver,
+                              self.process_search_url, max_images=self.max_images)
+
+    # Function to download image
+    def download_image(self, img_url, img_alt, index, session=None):
+        with self.metrics.timer("download"):
+            return self._download_image(img_url, img_alt, index, session)
+
+    def _download_image(self, img_url, img_alt, index, session=None):
+        metrics = self.metrics
+        dedup = self.dedup
+        http_cache = self.http_cache
         try:
-            print(f"\nProcessing image {index+1}")
-            
-            # Scroll to the thumbnail
-            driver.execute_script("arguments[0].scrollIntoView();", thumbnail)
-            time.sleep(1)
-            
-            # Click on the thumbnail to open the larger image preview
-            thumbnail.click()
-            time.sleep(2)
-            
-            # Try to find the high-resolution image in the right panel
+            # Skip URLs fetched in this or a previous run before any network request,
+            # unless they are due for a conditional revalidation
+            conditional = {}
+            if dedup.has_url(img_url):
+                if http_cache.is_fresh(img_url, self.revalidate_after):
+                    print(f"Already downloaded, skipping: {img_url[:50]}...")
+                    metrics.count("skipped.already_downloaded")
+                    return False
+                conditional = http_cache.conditional_headers(img_url)
+
+            # Create a filename from the alt text or use the index if alt is empty
+            if img_alt and len(img_alt.strip()) > 0:
+                filename = clean_filename(img_alt)[:50]  # Limit filename length
+            else:
+                filename = f"image_{index}"
+
+            # Download the image
+            headers = {**DOWNLOAD_HEADERS, **conditional}
+            # Use the engine's pooled per-host session when one is given. The body is
+            # buffered in memory, resuming an interrupted earlier transfer if there is one
+            http = session or requests
             try:
-                # First try to find the specific high-res image with iPVvYb class (displayed image)
-                try:
-                    print("Looking for high-res image with iPVvYb class...")
-                    high_res_img = WebDriverWait(driver, 3).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".sFlh5c.FyHeAf.iPVvYb"))
-                    )
-                except:
-                    # Fallback: try to find any high-res image
-                    print("Fallback: Looking for any high-res image...")
-                    high_res_img = WebDriverWait(driver, 3).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".sFlh5c.FyHeAf"))
-                    )
-                
-                # Get the high-resolution image URL and alt text
-                img_url = high_res_img.get_attribute("src")
-                img_alt = high_res_img.get_attribute("alt")
-                
-                print(f"Found image with class: {high_res_img.get_attribute('class')}")
-                print(f"Image style: {high_res_img.get_attribute('style')}")
-                
-                # Print the full HTML of the parent container for debugging
-                try:
-                    parent = high_res_img.find_element(By.XPATH, "./..")
-                    print(f"Parent HTML: {parent.get_attribute('outerHTML')[:200]}...")
-                except:
-                    print("Could not get parent HTML")
-                
-                # Try to find the source link if available
-                try:
-                    source_link = driver.find_element(By.CSS_SELECTOR, "a.YsLeY")
-                    original_source_url = source_link.get_attribute("href")
-                    print(f"Source URL: {original_source_url}")
-                except:
-                    original_source_url = None
-                    print("No source URL found")
-                
-                # Try to get image dimensions if available
+                with metrics.timer("http_request"):
+                    response, data = fetch_resumable(http, img_url, self.limiter, self.partials, headers,
+                                                     self.max_image_bytes, metrics,
+                                                     accept=lambda r: 'image' in r.headers.get('Content-Type', ''),
+                                                     stream=True, timeout=15)
+            except ImageRejected as e:
+                print(f"Downloaded file is not a valid image: {e}")
+                metrics.count(f"failed.{e.reason}")
+                return False
+
+            if response.status_code == 304:
+                print(f"Not modified since last crawl, skipping: {img_url[:50]}...")
+                http_cache.touch(img_url)
+                metrics.count("skipped.not_modified")
+                return False
+
+            if response.status_code in (200, 206):
+                # Check if it's actually an image
+                content_type = response.headers.get('Content-Type', '')
+                if data is not None:
+                    print(f"Image size: {len(data)/1024:.1f} KB")
+                    metrics.count("bytes_downloaded", len(data))
+
+                    # Validate the body (magic bytes, header, minimum size, full
+                    # decode) before anything touches disk
+                    try:
+                        with metrics.timer("validate"):
+                            ext, img, (width, height) = validate_image_bytes(data, self.min_image_width, self.min_image_height)
+                    except ImageRejected as e:
+                        print(f"Downloaded file is not a valid image: {e}")
+                        metrics.count(f"failed.{e.reason}")
+                        return False
+                    with img:
+                        phash = perceptual_hash(img)
+
+                    # Drop images we already have under another URL (exact or near-duplicate);
+                    # claiming checks and reserves the content in one step
+                    sha256 = sha256_bytes(data)
+                    if not dedup.claim(sha256, phash):
+                        print(f"Duplicate image content, skipping: {img_url[:50]}...")
+                        dedup.add_url(img_url, sha256)
+                        http_cache.store(img_url, response)
+                        metrics.count("skipped.duplicate_content")
+                        return False
+
+                    # Write the validated image in one call under a freshly reserved unique name
+                    try:
+                        filename, filepath, f = self.allocator.open_new(filename, ext)
+                        with f:
+                            f.write(data)
+                    except Exception:
+                        dedup.unclaim(sha256, phash)
+                        raise
+
+                    dedup.add(img_url, sha256, filename, phash)
+                    http_cache.store(img_url, response)
+                    print(f"Downloaded: {filename} ({width}x{height})")
+                    metrics.count("downloaded")
+
+                    # Hand the image to the augmentation stage without re-reading it from disk.
+                    # The image is stored either way, so a pipeline error does not fail the download.
+                    if self.augment_pipeline:
+                        try:
+                            self.augment_pipeline.submit(bytes(data), filename, sha256)
+                        except Exception as e:
+                            print(f"Could not queue {filename} for augmentation: {e}")
+                            metrics.count(f"augment_failed.{type(e).__name__}")
+                    return True
+                else:
+                    print(f"Not an image content type: {content_type}")
+                    metrics.count("failed.content_type")
+            else:
+                print(f"Failed to download image: {response.status_code}")
+                metrics.count(f"failed.status_{response.status_code}")
+        except Exception as e:
+            print(f"Error downloading image: {e}")
+            metrics.count(f"failed.{type(e).__name__}")
+        return False
+
+    # Function to process a single search URL
+    def process_search_url(self, driver, url, max_images=100):
+        metrics = self.metrics
+        journal = self.journal
+        limiter = self.limiter
+        engine = self.engine
+        print(f"\n{'='*50}")
+        print(f"Processing search URL: {url}")
+        print(f"{'='*50}\n")
+
+        # Pick up where an interrupted run stopped (only with resume)
+        progress = journal.progress(url)
+        if progress.done:
+            print(f"Already finished in a previous run ({progress.count} images), skipping")
+            return progress.count
+        start_index = progress.resume_index
+        previous_downloads = progress.count
+        if start_index or previous_downloads:
+            print(f"Resuming at thumbnail {start_index+1} with {previous_downloads} images already downloaded")
+
+        # Open Google Images search and wait for the page to load
+        limiter.acquire(url)
+        with metrics.timer("page_load"):
+            load_start = time.monotonic()
+            try:
+                driver.get(url)
+                loaded = wait_for_page_ready(driver, self.page_load_timeout, self.ready_states)
+            except TimeoutException:
+                loaded = False
+            if loaded:
+                limiter.record_success(url, time.monotonic() - load_start)
+            else:
+                # A slow page slows the next ones down too
+                limiter.record_failure(url)
+                print("Search page load timed out, continuing with what has loaded")
+        print("Page title:", driver.title)
+
+        # Wait for the first thumbnails to render; more are loaded by scrolling as needed
+        WebDriverWait(driver, 10).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".H8Rx8c"))
+        )
+        thumbnails = harvest_thumbnails(driver, ".H8Rx8c", self.scroll_timeout, self.max_idle_scrolls)
+
+        # Full-size URLs embedded in the page, for the fast path
+        page_data = PageDataIndex()
+        next_refresh_index = 0
+
+        # Track downloads queued for this URL; they run in the background
+        batch = DownloadBatch()
+
+        # Source pages are fetched over plain HTTP first, then in one reusable tab
+        source_blocking = BLOCKED_URL_PATTERNS + IMAGE_URL_PATTERNS if self.lean_browser else None
+        resolver = SourcePageResolver(driver, self.source_page_timeout, block_patterns=source_blocking,
+                                      ready_states=self.ready_states)
+
+        # Process each thumbnail; the source tab is closed even if the loop fails
+        try:
+            for index, thumbnail in thumbnails:
+                # Skip thumbnails already handled before the interruption
+                if index < start_index:
+                    continue
+
+                # Stop if we've reached the maximum number of images
+                if not batch.wait_for_room(max_images - previous_downloads):
+                    print(f"Reached maximum of {max_images} successful downloads for this URL")
+                    break
+
                 try:
-                    dimensions_span = driver.find_element(By.CSS_SELECTOR, ".UWuvyf")
-                    dimensions = dimensions_span.text
-                    print(f"Image dimensions: {dimensions}")
-                except:
-                    print("No dimensions found")
-                
-                print(f"Image URL: {img_url[:50]}...")
-                print(f"Image Alt: {img_alt[:50]}..." if img_alt else "No alt text")
-                
-                # If we have a high-quality image URL, download it
-                if img_url and not img_url.startswith("data:") and not img_url.startswith("https://encrypted-tbn0"):
-                    # Special handling for Reuters images which are high quality
-                    if "reuters.com/resizer" in img_url:
-                        print("Found Reuters high-resolution image!")
-                        # Try to get the highest quality possible by removing quality parameter
+                    print(f"\nProcessing image {index+1}")
+
+                    # Fast path: look the thumbnail up in the page data instead of clicking it
+                    if self.use_fast_path:
+                        with metrics.timer("fast_path"):
+                            thumb = extract_thumbnail(driver, thumbnail)
+                            record = page_data.lookup(thumb)
+                            if record is None and index >= next_refresh_index:
+                                # Results loaded by scrolling are only in the current page source
+                                page_data.refresh(driver.page_source)
+                                next_refresh_index = index + self.fast_path_refresh_every
+                                record = page_data.lookup(thumb)
+                        metrics.count("fast_path.hit" if record else "fast_path.miss")
+                        if record:
+                            img_url = best_quality_url(record["url"])
+                            print(f"Resolved from page data: {img_url[:50]}...")
+                            batch.add(journal.track(url, index, img_url, engine.submit(img_url, thumb["alt"], index)))
+                            journal.record_reached(url, index + 1)
+                            continue
+
+                    # Scroll to the thumbnail
+                    driver.execute_script("arguments[0].scrollIntoView();", thumbnail)
+
+                    # Click on the thumbnail to open the larger image preview
+                    click_start = time.perf_counter()
+                    previous_src = current_preview_src(driver)
+                    thumbnail.click()
+
+                    # Try to find the high-resolution image in the right panel
+                    try:
+                        # First wait for the displayed iPVvYb image to switch to the new high-res src
                         try:
-                            if "&quality=" in img_url:
-                                img_url = re.sub(r'&quality=\d+', '&quality=100', img_url)
-                                print(f"Modified to highest quality: {img_url[:100]}...")
+                            print("Looking for high-res image with iPVvYb class...")
+                            high_res_img = wait_for_preview(driver, previous_src, self.preview_timeout)
                         except:
-                            pass
-                    
-                    print("Downloading high-quality image...")
-                    download_success = download_image(img_url, img_alt, index)
-                    if download_success:
-                        successful_downloads += 1
-                # If the image is still a thumbnail, try to visit the source page
-                elif original_source_url:
-                    print("Image appears to be a thumbnail, visiting source page...")
-                    
-                    # Open the source page in a new tab
-                    driver.execute_script("window.open(arguments[0]);", original_source_url)
-                    
-                    # Switch to the new tab
-                    driver.switch_to.window(driver.window_handles[-1])
-                    
-                    # Wait for the page to load
-                    time.sleep(5)
-                    
-                    # Try to find the largest image on the page
-                    try:
-                        # Look for all images on the page
-                        images = driver.find_elements(By.TAG_NAME, "img")
-                        
-                        # Filter out small images (likely icons, etc.)
-                        large_images = []
-                        for img in images:
-                            try:
-                                width = int(img.get_attribute("width") or 0)
-                                height = int(img.get_attribute("height") or 0)
-                                src = img.get_attribute("src")
-                                
-                                # Only consider reasonably sized images with a valid src
-                                if src and (width > 300 or height > 300):
-                                    large_images.append((img, width * height, src))
-                            except:
-                                continue
-                        
-                        # Sort by size (largest first)
-                        large_images.sort(key=lambda x: x[1], reverse=True)
-                        
-                        if large_images:
-                            best_img, size, src = large_images[0]
-                            print(f"Found large image on source page: {src[:50]}...")
-                            download_success = download_image(src, img_alt or "source_image", index)
-                            if download_success:
-                                successful_downloads += 1
+                            # Fallback: try to find any high-res image
+                            print("Fallback: Looking for any high-res image...")
+                            high_res_img = WebDriverWait(driver, 3).until(
+                                EC.presence_of_element_located((By.CSS_SELECTOR, ".sFlh5c.FyHeAf"))
+                            )
+                        metrics.observe("click_preview", time.perf_counter() - click_start)
+
+                        # Read the image URL, alt text, source link and dimensions in one call
+                        preview = extract_preview(driver, high_res_img)
+                        img_url = preview["src"]
+                        img_alt = preview["alt"]
+
+                        print(f"Found image with class: {preview['className']}")
+                        print(f"Image style: {preview['style']}")
+
+                        # Print the full HTML of the parent container for debugging
+                        if preview["parentHTML"]:
+                            print(f"Parent HTML: {preview['parentHTML']}...")
+                        else:
+                            print("Could not get parent HTML")
+
+                        # Use the source link if available
+                        original_source_url = preview["sourceUrl"]
+                        if original_source_url:
+                            print(f"Source URL: {original_source_url}")
                         else:
-                            print("No suitable images found on source page")
-                            
+                            print("No source URL found")
+
+                        # Show image dimensions if available
+                        if preview["dimensions"]:
+                            print(f"Image dimensions: {preview['dimensions']}")
+                        else:
+                            print("No dimensions found")
+
+                        print(f"Image URL: {img_url[:50]}...")
+                        print(f"Image Alt: {img_alt[:50]}..." if img_alt else "No alt text")
+
+                        # If we have a high-quality image URL, download it
+                        if img_url and not img_url.startswith("data:") and not img_url.startswith("https://encrypted-tbn0"):
+                            # Special handling for Reuters images which are high quality
+                            img_url = best_quality_url(img_url)
+
+                            print("Downloading high-quality image...")
+                            batch.add(journal.track(url, index, img_url, engine.submit(img_url, img_alt, index)))
+                        # If the image is still a thumbnail, try to visit the source page
+                        elif original_source_url:
+                            print("Image appears to be a thumbnail, visiting source page...")
+
+                            # Resolve the main image over plain HTTP, or in the reusable source tab
+                            limiter.acquire(original_source_url)
+                            with metrics.timer("source_page"):
+                                src, how = resolver.resolve(original_source_url)
+
+                            if src:
+                                print(f"Found large image on source page ({how}): {src[:50]}...")
+                                metrics.count(f"source_page.{how}")
+                                batch.add(journal.track(url, index, src, engine.submit(src, img_alt or "source_image", index)))
+                            else:
+                                print("No suitable images found on source page")
+                        else:
+                            print("Skipping image with data URL or empty URL")
+
                     except Exception as e:
-                        print(f"Error finding image on source page: {e}")
-                    
-                    # Close the tab and switch back to the main window
-                    driver.close()
-                    driver.switch_to.window(driver.window_handles[0])
-                else:
-                    print("Skipping image with data URL or empty URL")
-                    
-            except Exception as e:
-                print(f"Error finding high-quality image: {e}")
-                
-        except Exception as e:
-            print(f"Error processing thumbnail {index+1}: {e}")
-        
-        # Small delay before next image
-        time.sleep(1)
-    
-    return successful_downloads
-
-# Process each search URL
-total_downloads = 0
-for url in search_urls:
-    downloads = process_search_url(url, max_images=100)
-    total_downloads += downloads
-    print(f"Downloaded {downloads} images from {url}")
-
-print(f"\nTotal images downloaded: {total_downloads}")
-
-# Close the browser
-driver.quit()
+                        print(f"Error finding high-quality image: {e}")
+                        metrics.count("failed.no_preview")
+
+                except Exception as e:
+                    print(f"Error processing thumbnail {index+1}: {e}")
+
+                # Checkpoint: every thumbnail up to this one has been handled
+                journal.record_reached(url, index + 1)
+        finally:
+            resolver.close()
+
+        # Wait for this query's downloads so the per-URL count is final
+        successful_downloads = previous_downloads + batch.drain()
+        journal.finish(url)
+        return successful_downloads
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download images from Google Images searches")
+    parser.add_argument('-q', '--query', action='append', help="search for this text (repeatable)")
+    parser.add_argument('--search-url', action='append', help="search URL to process (repeatable); "
+                        "without --query or --search-url the built-in list is used")
+    parser.add_argument('--download-dir', help="where to save images (default: ./downloaded_images)")
+    parser.add_argument('--max-images', type=int, default=100, help="successful downloads to stop at per search URL")
+    parser.add_argument('--browser-workers', type=int, default=4, help="number of browsers crawling in parallel")
+    parser.add_argument('--download-workers', type=int, default=8, help="number of download threads")
+    parser.add_argument('--per-host-limit', type=int, default=8, help="most simultaneous downloads per host")
+    parser.add_argument('--min-host-delay', type=float, default=ImageScraper.min_host_delay,
+                        help="minimum seconds between requests to the same host (default: no minimum)")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint instead of starting over")
+    parser.add_argument('--no-fast-path', action='store_true', help="always click thumbnails instead of reading page data")
+    parser.add_argument('--full-browser', action='store_true', help="visible browser with full rendering instead of the lean headless profile")
+    parser.add_argument('--augment-dir', help="augment images into this folder while scraping")
+    parser.add_argument('--driver-path', help="chromedriver binary to use (default: $CHROMEDRIVER or a cached install)")
+    parser.add_argument('--refresh-driver', action='store_true', help="reinstall chromedriver instead of using the cached one")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    search_urls = [search_url_for(q) for q in args.query or []] + (args.search_url or [])
+    driver_path = args.driver_path or (chromedriver_path(refresh=True) if args.refresh_driver else None)
+    scraper = ImageScraper(args.download_dir, max_images=args.max_images, browser_workers=args.browser_workers,
+                           download_workers=args.download_workers, per_host_limit=args.per_host_limit,
+                           use_fast_path=not args.no_fast_path, lean_browser=not args.full_browser,
+                           resume=args.resume, augment_dir=args.augment_dir, driver_path=driver_path)
+    scraper.min_host_delay = args.min_host_delay
+    # Leaving the with block waits for every queued download before exiting
+    with scraper:
+        results = scraper.run(search_urls or None)
+    print(f"\nTotal images downloaded: {sum(results.values())}")
+    scraper.metrics.print_summary()
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,80 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 import os
+import time
 import requests
 import urllib.parse
 import re
+from download_engine import DownloadEngine, DownloadBatch
+from scrape_metrics import Metrics
+from filename_allocator import FilenameAllocator
+from dedup_index import DedupIndex, sha256_bytes
+from image_validation import ImageRejected, validate_image_bytes
+from dom_extract import extract_page_images, extract_preview
+from page_waits import wait_for_page_ready, current_preview_src, wait_for_preview
+from rate_limit import RateLimiter
+from webscraping import chromedriver_path
+from http_cache import HttpCache, PartialDownloads, fetch_resumable
 
 # Create a directory to save images if it doesn't exist
 download_dir = os.path.join(os.getcwd(), 'bike')
 os.makedirs(download_dir, exist_ok=True)
 print(f"Images will be saved to: {download_dir}")
 
+# Per-stage timings and counters, appended as JSON lines and summarized at the end
+metrics = Metrics(os.path.join(download_dir, 'metrics.jsonl'))
+
+# Download concurrency: total worker threads and the most simultaneous
+# requests per host the adaptive limiter may ramp up to
+download_workers = 8
+per_host_limit = 8
+
+# Timeout budgets (seconds) for the condition-based waits that replace fixed sleeps
+page_load_timeout = 10
+preview_timeout = 5
+source_page_timeout = 8
+
+# Adaptive per-host rate limiting for downloads and page loads: each host starts
+# at request_rate requests/second and host_concurrency parallel downloads, then
+# speeds up while responses stay fast and backs off on 429/5xx, timeouts and
+# slow responses (honouring Retry-After); failed requests are retried up to
+# max_retries times with exponential backoff and jitter
+request_rate = 5.0
+host_concurrency = 4
+max_retries = 3
+# Optional minimum delay (seconds) between requests to the same host; 0 for none
+min_host_delay = 0.0
+limiter = RateLimiter(rate=request_rate, concurrency=host_concurrency,
+                      max_concurrency=per_host_limit, max_retries=max_retries, min_delay=min_host_delay)
+
+# Optional in-memory validation (off here: this script saves whatever it gets);
+# bodies are always buffered up to max_image_bytes and written in one call
+validate_downloads = False
+max_image_bytes = 25 * 1024 * 1024
+min_image_width = 100
+min_image_height = 100
+
+# Allocates unique filenames in download_dir from an in-memory index
+allocator = FilenameAllocator(download_dir)
+
+# Persistent index of downloaded URLs and image hashes, shared across runs
+dedup = DedupIndex(os.path.join(download_dir, 'dedup_index.sqlite'))
+
+# ETag / Last-Modified of stored images: URLs already downloaded are revalidated
+# with a conditional request once they are older than revalidate_after seconds
+# (None never revalidates). Interrupted transfers are resumed with Range requests.
+revalidate_after = 7 * 24 * 3600
+http_cache = HttpCache(os.path.join(download_dir, 'http_cache.sqlite'))
+partials = PartialDownloads(os.path.join(download_dir, '.partial'))
+
 # Properly initialize the WebDriver with options to avoid detection
 options = webdriver.ChromeOptions()
 options.add_argument('--disable-blink-features=AutomationControlled')
 options.add_argument('--start-maximized')
-service = Service(ChromeDriverManager().install())
+service = Service(chromedriver_path())
 driver = webdriver.Chrome(service=service, options=options)
 
 
@@ -28,8 +83,19 @@ def clean_filename(filename):
     return re.sub(r'[\\/*?:"<>|]', "", filename)
 
 # Function to download image - simplified to just download without validation
-def download_image(img_url, img_alt, index):
+@metrics.timed("download")
+def download_image(img_url, img_alt, index, session=None):
     try:
+        # Skip URLs fetched in this or a previous run before any network request,
+        # unless they are due for a conditional revalidation
+        conditional = {}
+        if dedup.has_url(img_url):
+            if http_cache.is_fresh(img_url, revalidate_after):
+                print(f"Already downloaded, skipping: {img_url[:50]}...")
+                metrics.count("skipped.already_downloaded")
+                return False
+            conditional = http_cache.conditional_headers(img_url)
+        
         # Create a filename from the alt text or use the index if alt is empty
         if img_alt and len(img_alt.strip()) > 0:
             filename = clean_filename(img_alt)[:50]  # Limit filename length
@@ -49,39 +115,79 @@ def download_image(img_url, img_alt, index):
                 ext = 'jpg'
         else:
             ext = 'jpg'
-            
-        # Add extension
-        filename = f"{filename}.{ext}"
-        filepath = os.path.join(download_dir, filename)
-        
-        # Check if file already exists, add number if it does
-        counter = 1
-        original_filename = filename
-        while os.path.exists(filepath):
-            filename = f"{original_filename.split('.')[0]}_{counter}.{ext}"
-            filepath = os.path.join(download_dir, filename)
-            counter += 1
         
         # Download the image
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'image/avif,image/webp,image/apng,image/*,*/*;q=0.8'
         }
-        response = requests.get(img_url, stream=True, timeout=15, headers=headers)
+        headers.update(conditional)
+        # Use the engine's pooled per-host session when one is given. The body is
+        # buffered in memory (resuming an interrupted earlier transfer if there is
+        # one); in validation mode it is checked before anything touches disk
+        http = session or requests
+        try:
+            with metrics.timer("http_request"):
+                response, data = fetch_resumable(http, img_url, limiter, partials, headers, max_image_bytes, metrics,
+                                                 stream=True, timeout=15)
+        except ImageRejected as e:
+            print(f"Rejected image: {e}")
+            metrics.count(f"failed.{e.reason}")
+            return False
+        
+        if response.status_code == 304:
+            print(f"Not modified since last crawl, skipping: {img_url[:50]}...")
+            http_cache.touch(img_url)
+            metrics.count("skipped.not_modified")
+            return False
         
-        if response.status_code == 200:
-            # Save the image without validation
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(8192):
-                    f.write(chunk)
+        if response.status_code in (200, 206):
+            try:
+                metrics.count("bytes_downloaded", len(data))
+                if validate_downloads:
+                    ext, img, _ = validate_image_bytes(data, min_image_width, min_image_height)
+                    img.close()
+            except ImageRejected as e:
+                print(f"Rejected image: {e}")
+                metrics.count(f"failed.{e.reason}")
+                return False
+            
+            # Drop exact duplicates we already have under another URL; claiming
+            # checks and reserves the content in one step
+            sha256 = sha256_bytes(data)
+            if not dedup.claim(sha256):
+                print(f"Duplicate image content, skipping: {img_url[:50]}...")
+                dedup.add_url(img_url, sha256)
+                http_cache.store(img_url, response)
+                metrics.count("skipped.duplicate_content")
+                return False
+            
+            # Write the image in one call under a freshly reserved unique name
+            try:
+                filename, filepath, f = allocator.open_new(filename, ext)
+                with f:
+                    f.write(data)
+            except Exception:
+                dedup.unclaim(sha256)
+                raise
+            
+            dedup.add(img_url, sha256, filename)
+            http_cache.store(img_url, response)
             print(f"Downloaded: {filename}")
+            metrics.count("downloaded")
             return True
         else:
             print(f"Failed to download image: {response.status_code}")
+            metrics.count(f"failed.status_{response.status_code}")
     except Exception as e:
         print(f"Error downloading image: {e}")
+        metrics.count(f"failed.{type(e).__name__}")
     return False
 
+# Background download engine shared by all queries
+engine = DownloadEngine(download_image, max_workers=download_workers, per_host_limit=per_host_limit,
+                        limiter=limiter)
+
 # List of search URLs to process
 search_urls = [
     # "https://www.google.com/search?q=honda+bike+india&tbm=isch",
@@ -102,11 +208,17 @@ def process_search_url(url, max_images=100):
     print(f"Processing search URL: {url}")
     print(f"{'='*50}\n")
     
-    # Open Google Images search
-    driver.get(url)
-    
-    # Wait for the page to load
-    time.sleep(3)
+    # Open Google Images search and wait for the page to load
+    limiter.acquire(url)
+    with metrics.timer("page_load"):
+        load_start = time.monotonic()
+        driver.get(url)
+        if wait_for_page_ready(driver, page_load_timeout):
+            limiter.record_success(url, time.monotonic() - load_start)
+        else:
+            # A slow page slows the next ones down too
+            limiter.record_failure(url)
+            print("Search page load timed out, continuing with what has loaded")
     print("Page title:", driver.title)
     
     # Find all thumbnail images
@@ -116,13 +228,13 @@ def process_search_url(url, max_images=100):
     
     print(f"Found {len(thumbnails)} image thumbnails")
     
-    # Track successful downloads for this URL
-    successful_downloads = 0
+    # Track downloads queued for this URL; they run in the background
+    batch = DownloadBatch()
     
     # Process each thumbnail
     for index, thumbnail in enumerate(thumbnails):
         # Stop if we've reached the maximum number of images
-        if successful_downloads >= max_images:
+        if not batch.wait_for_room(max_images):
             print(f"Reached maximum of {max_images} successful downloads for this URL")
             break
             
@@ -131,35 +243,31 @@ def process_search_url(url, max_images=100):
             
             # Scroll to the thumbnail
             driver.execute_script("arguments[0].scrollIntoView();", thumbnail)
-            time.sleep(1)
             
             # Click on the thumbnail to open the larger image preview
+            previous_src = current_preview_src(driver)
             thumbnail.click()
-            time.sleep(2)
             
             # Try to find the high-resolution image in the right panel
             try:
-                # First try to find the specific high-res image with iPVvYb class (displayed image)
+                # First wait for the displayed iPVvYb image to switch to the new high-res src
                 try:
-                    high_res_img = WebDriverWait(driver, 3).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".sFlh5c.FyHeAf.iPVvYb"))
-                    )
+                    high_res_img = wait_for_preview(driver, previous_src, preview_timeout)
                 except:
                     # Fallback: try to find any high-res image
                     high_res_img = WebDriverWait(driver, 3).until(
                         EC.presence_of_element_located((By.CSS_SELECTOR, ".sFlh5c.FyHeAf"))
                     )
                 
-                # Get the high-resolution image URL and alt text
-                img_url = high_res_img.get_attribute("src")
-                img_alt = high_res_img.get_attribute("alt")
+                # Read the high-resolution image URL and alt text in one call
+                preview = extract_preview(driver, high_res_img)
+                img_url = preview["src"]
+                img_alt = preview["alt"]
                 
                 # If we have a valid image URL, download it
                 if img_url and not img_url.startswith("data:") and not img_url.startswith("https://encrypted-tbn0"):
                     print(f"Downloading image: {img_url[:50]}...")
-                    download_success = download_image(img_url, img_alt, index)
-                    if download_success:
-                        successful_downloads += 1
+                    batch.add(engine.submit(img_url, img_alt, index))
                 # Try to get the source URL if available
                 else:
                     try:
@@ -167,26 +275,25 @@ def process_search_url(url, max_images=100):
                         original_source_url = source_link.get_attribute("href")
                         
                         # Open the source page in a new tab
+                        limiter.acquire(original_source_url)
                         driver.execute_script("window.open(arguments[0]);", original_source_url)
                         
                         # Switch to the new tab
                         driver.switch_to.window(driver.window_handles[-1])
                         
                         # Wait for the page to load
-                        time.sleep(3)
+                        wait_for_page_ready(driver, source_page_timeout)
                         
-                        # Try to find images on the page
-                        images = driver.find_elements(By.TAG_NAME, "img")
+                        # Collect every image on the page in a single script call
+                        images = extract_page_images(driver)
                         
                         if images:
                             # Just get the first image with a valid src
                             for img in images:
-                                src = img.get_attribute("src")
+                                src = img["src"]
                                 if src and not src.startswith("data:") and len(src) > 10:
                                     print(f"Downloading image from source page: {src[:50]}...")
-                                    download_success = download_image(src, img_alt or "source_image", index)
-                                    if download_success:
-                                        successful_downloads += 1
+                                    batch.add(engine.submit(src, img_alt or "source_image", index))
                                     break
                         
                         # Close the tab and switch back to the main window
@@ -200,10 +307,9 @@ def process_search_url(url, max_images=100):
                 
         except Exception as e:
             print(f"Error processing thumbnail {index+1}: {e}")
-        
-        # Small delay before next image
-        time.sleep(1)
     
+    # Wait for this query's downloads so the per-URL count is final
+    successful_downloads = batch.drain()
     return successful_downloads
 
 # Process each search URL
@@ -213,7 +319,13 @@ for url in search_urls:
     total_downloads += downloads
     print(f"Downloaded {downloads} images from {url}")
 
+# Make sure every queued download has finished before exiting
+engine.close()
+dedup.close()
+http_cache.close()
+metrics.close()
 print(f"\nTotal images downloaded: {total_downloads}")
+metrics.print_summary()
 
 # Close the browser
 driver.quit()